@@ -0,0 +1,214 @@
+import json
+import os
+import sys
+import time
+import random
+import hashlib
+import argparse
+import resource
+import subprocess
+from moviemix import Utils, FFmpeg, Config, Storage, Mixer, Metrics
+
+class Scenarios:
+    """ Fixed seed Mixer scenarios over synthetic sources. Every source is
+        (name, w, h, duration, gop), generated once with ffmpeg test patterns """
+
+    @staticmethod
+    def sources(prefix, count, sizes, durations, gops):
+        return [
+            ("%s%02d.mp4" % (prefix, i), sizes[i % len(sizes)][0], sizes[i % len(sizes)][1],
+                durations[i % len(durations)], gops[i % len(gops)])
+            for i in range(count)
+        ]
+
+    @staticmethod
+    def config(**overrides):
+        config = {
+            "mix_mode": "multi",
+            "transition": "static",
+            "ordering": "random",
+            "clipping": {
+                "mode": "clip",
+                "duration": { "min": 2, "max": 4 },
+                "bounds": { "start": 0 },
+                "compile": "gen"
+            },
+            "format": "mp4",
+            "filler": "looping",
+            "stitch": {
+                "duration": { "min": -1, "max": -1 },
+                "resolution": { "strategy": "width" },
+                "frames": { "fps": 25, "bitrate": "2000k" }
+            },
+            "iterations": 2,
+            "seed": 1234,
+            "metrics": { "enabled": True }
+        }
+        return Utils.merge(config, overrides)
+
+    @staticmethod
+    def all():
+        return {
+            "many_short": {
+                "sources": Scenarios.sources("short", 40, [(320, 240)], [4, 5, 6], [25]),
+                "config": Scenarios.config()
+            },
+            "few_long": {
+                "sources": Scenarios.sources("long", 3, [(1280, 720)], [20, 25, 30], [50]),
+                "config": Scenarios.config(stitch = { "duration": { "max": 45 } })
+            },
+            "heavy_looping": {
+                "sources": Scenarios.sources("loop", 3, [(640, 360)], [2, 3], [12]),
+                "config": Scenarios.config(stitch = { "duration": { "min": 60 } })
+            },
+            "mixed_resolutions": {
+                "sources": Scenarios.sources("mixed", 8, [(320, 240), (640, 360), (960, 540), (1280, 720)], [6, 8], [25, 60, 250]),
+                "config": Scenarios.config()
+            },
+            "unique_history": {
+                "sources": Scenarios.sources("unique", 6, [(320, 240)], [5, 6, 7], [25]),
+                "config": Scenarios.config(clipping = { "compile": "unique" }),
+                "history": 100000
+            }
+        }
+
+
+class Benchmark:
+    root = "./benchmark"
+    baseline_path = "./benchmark_baseline.json"
+
+    @staticmethod
+    def generate_sources(work_dir, sources):
+        for name, w, h, duration, gop in sources:
+            file_path = work_dir + "/" + name
+            if Utils.file_exists(file_path):
+                continue
+            Utils.log(" - Generating (%s) %dx%d, %ds, gop %d" % (name, w, h, duration, gop))
+            FFmpeg.run([
+                "-f", "lavfi", "-i", "testsrc2=size=%dx%d:rate=25" % (w, h),
+                "-t", str(duration), "-g", str(gop), "-pix_fmt", "yuv420p",
+                "-c:v", "libx264", "-preset", "ultrafast", "-bitexact",
+                file_path
+            ])
+
+    @staticmethod
+    def seed_history(count):
+        """ Fills the pattern store with `count` random (never drawn) patterns """
+        Utils.log(" - Seeding a history of (%d) patterns" % (count))
+        rng = random.Random(count)
+        storage = Storage.open(Config())
+        for _ in range(storage.count(), count):
+            storage.store(hashlib.md5(str(rng.random()).encode("utf-8")).hexdigest(), True)
+        storage.close()
+
+    @staticmethod
+    def prepare(name, scenario, overrides):
+        work_dir = Benchmark.root + "/" + name
+        os.makedirs(work_dir, exist_ok=True)
+        Benchmark.generate_sources(work_dir, scenario["sources"])
+        # every run starts from the same state: no caches, outputs nor history
+        for each_file in os.listdir(work_dir):
+            if each_file.endswith(".mp4") and each_file in [i[0] for i in scenario["sources"]]:
+                continue
+            if os.path.isdir(work_dir + "/" + each_file):
+                Utils.create_dir(work_dir + "/" + each_file, True)
+            else:
+                os.unlink(work_dir + "/" + each_file)
+        Utils.write_to_file(work_dir + "/" + Config.config_path, json.dumps(Utils.merge(scenario["config"], overrides), indent=1))
+        return work_dir
+
+    @staticmethod
+    def run_scenario(name, overrides):
+        """ Runs within its own process, so that peak memory is the scenario's own """
+        scenario = Scenarios.all()[name]
+        work_dir = Benchmark.prepare(name, scenario, overrides)
+        os.chdir(work_dir)
+        if "history" in scenario:
+            Benchmark.seed_history(scenario["history"])
+
+        started = time.perf_counter()
+        failures = Mixer.failures(Mixer().start())
+        wall = time.perf_counter() - started
+        if len(failures) > 0:
+            # a failed render is no measurement, let alone a baseline
+            raise Exception("[x] Iterations %s failed" % (", ".join(str(i) for i in failures)))
+
+        output_seconds = sum(FFmpeg.probe(Mixer.output_dir + "/" + i)["duration"] for i in os.listdir(Mixer.output_dir) if not i.startswith("."))
+        stages = {}
+        for line in Utils.get_file_contents(Metrics.path).splitlines():
+            for stage, timings in json.loads(line)["stages"].items():
+                stages[stage] = stages.get(stage, 0.0) + timings["wall"]
+        return {
+            "wall": wall,
+            "output_seconds": output_seconds,
+            "throughput": output_seconds / wall,
+            "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "peak_rss_children_kb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+            "stages": stages
+        }
+
+    @staticmethod
+    def run(names, overrides):
+        """ Runs every scenario in a process of its own, returns the results & the scenarios that crashed """
+        results = {}
+        failures = []
+        for each_name in names:
+            Utils.log(">> Benchmark: (%s)" % (each_name))
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--scenario", each_name, "--override", json.dumps(overrides)],
+                stdout=subprocess.PIPE
+            )
+            if proc.returncode != 0:
+                Utils.log(" [x] Scenario (%s) failed" % (each_name))
+                failures.append(each_name)
+                continue
+            results[each_name] = json.loads(proc.stdout.decode("utf-8").strip().splitlines()[-1])
+        return results, failures
+
+    @staticmethod
+    def report(results, baseline, tolerance):
+        """ Prints every result against the baseline, returns the regressed scenarios """
+        regressions = []
+        Utils.log("")
+        Utils.log("%-20s %10s %12s %12s %14s" % ("scenario", "wall (s)", "out (s)", "out/wall", "peak rss (MB)"))
+        for name, result in results.items():
+            peak = max(result["peak_rss_kb"], result["peak_rss_children_kb"]) / 1024.0
+            line = "%-20s %10.2f %12.2f %12.3f %14.1f" % (name, result["wall"], result["output_seconds"], result["throughput"], peak)
+            if name in baseline and baseline[name]["throughput"] > 0:
+                change = result["throughput"] / baseline[name]["throughput"] - 1.0
+                line = line + "  (%+.1f%% vs baseline)" % (change * 100)
+                if change < -tolerance:
+                    regressions.append(name)
+            Utils.log(line)
+            Utils.log("    " + ", ".join("%s: %.2fs" % (k, v) for k, v in sorted(result["stages"].items(), key=lambda i: -i[1])))
+        return regressions
+
+
+if __name__ == "__main__":
+    scenarios = sorted(Scenarios.all().keys())
+    parser = argparse.ArgumentParser(description = "MovieMix benchmarks over synthetic sources")
+    parser.add_argument("names", nargs = "*", default = scenarios, help = "scenarios to run, out of: " + ", ".join(scenarios))
+    parser.add_argument("--override", default = "{}", help = "JSON merged over every scenario's config.json")
+    parser.add_argument("--save-baseline", action = "store_true", help = "store the results as the new baseline")
+    parser.add_argument("--tolerance", type = float, default = 0.15, help = "throughput drop that counts as a regression")
+    parser.add_argument("--scenario", help = argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario is not None:
+        result = Benchmark.run_scenario(args.scenario, json.loads(args.override))
+        print(json.dumps(result))
+        sys.exit(0)
+
+    baseline = Utils.get_file_contents(Benchmark.baseline_path, True) if Utils.file_exists(Benchmark.baseline_path) else {}
+    results, failures = Benchmark.run(args.names, json.loads(args.override))
+    regressions = Benchmark.report(results, baseline, args.tolerance)
+    if args.save_baseline:
+        baseline.update(results)
+        Utils.write_to_file(Benchmark.baseline_path, json.dumps(baseline, indent=1))
+        Utils.log(">> Benchmark: Baseline saved to (%s)" % (Benchmark.baseline_path))
+    if len(regressions) > 0:
+        Utils.log(" [x] Throughput regressions in: " + ", ".join(regressions))
+    if len(failures) > 0:
+        Utils.log(" [x] Scenarios that failed: " + ", ".join(failures))
+    if len(regressions) > 0 or len(failures) > 0:
+        sys.exit(1)
@@ -1,13 +1,37 @@
 import json
 import os
+import sys
+import queue
+import argparse
+import itertools
+import http.server
 import random
+import atexit
+import sqlite3
 import hashlib
+import time
+import cProfile
+import resource
+import contextlib
+import collections
+import threading
+import multiprocessing
+import multiprocessing.connection
+import multiprocessing.forkserver
+import concurrent.futures
 import shutil
+import numpy
+import re
+import math
+import base64
+import bisect
+import subprocess
+from array import array
 from random import seed
 from random import randint
 import moviepy.editor as mp
-from moviepy.video.io.ffmpeg_tools import ffmpeg_extract_subclip
 from moviepy.video.io.VideoFileClip import VideoFileClip
+from moviepy.config import get_setting
 from datetime import datetime
 
 class Utils:
@@ -74,6 +98,14 @@ class Utils:
                     raise "[x] Error encountered when attempting to delete (%s)" % (file_path)
             return
     
+    @staticmethod
+    def merge(base, overrides):
+        """ Copy of base with overrides deep merged over it """
+        merged = dict(base)
+        for k, v in overrides.items():
+            merged[k] = Utils.merge(merged[k], v) if isinstance(v, dict) and isinstance(merged.get(k), dict) else v
+        return merged
+
     @staticmethod
     def generate_range_seq(start, end, random_order=False):
         r = list(range(start, end))
@@ -97,6 +129,311 @@ class Utils:
         r = Utils.in_order(population_list, start, end, population)
         r.reverse()
 
+class FFmpeg:
+    RE_DURATION = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+    RE_VIDEO = re.compile(r"Stream #\d+:\d+.*?: Video: (\w+).*?, (\d+)x(\d+)")
+    RE_FPS = re.compile(r"([\d.]+) (?:fps|tbr)")
+    # the codec's description (profile & tag) & the pixel format following it
+    RE_FORMAT = re.compile(r"Video: \w+ ?([^,]*), (\w+)")
+
+    @staticmethod
+    def binary():
+        return get_setting("FFMPEG_BINARY")
+
+    @staticmethod
+    def timestamp(t):
+        # Rounded up, so that a seek to a keyframe never lands on the one before it
+        return "%0.6f" % (math.ceil(t * 1000000) / 1000000.0)
+
+    @staticmethod
+    def run(args, timeout = None, stdout = subprocess.DEVNULL):
+        cmd = [FFmpeg.binary(), "-hide_banner", "-loglevel", "error", "-y"] + args
+        Metrics.count("ffmpeg_processes")
+        proc = subprocess.Popen(cmd, stdout=stdout, stderr=subprocess.PIPE)
+        expired = threading.Event()
+        timer = None
+        if timeout is not None:
+            timer = threading.Timer(timeout, lambda: (expired.set(), proc.kill()))
+            timer.start()
+        try:
+            errors = FFmpeg.reap(proc)
+        finally:
+            if timer is not None:
+                timer.cancel()
+        if expired.is_set():
+            raise Exception("[x] ffmpeg timed out after (%ss): %s" % (timeout, " ".join(args)))
+        if proc.returncode != 0:
+            raise Exception("[x] ffmpeg failed (%d): %s" % (
+                proc.returncode, errors.decode("utf-8", errors="ignore").strip()))
+        return proc
+
+    @staticmethod
+    def open(args):
+        """ Starts ffmpeg reading its input from a pipe, to be fed & then closed """
+        Metrics.count("ffmpeg_processes")
+        return subprocess.Popen(
+            [FFmpeg.binary(), "-hide_banner", "-loglevel", "error", "-y"] + args,
+            stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+        )
+
+    @staticmethod
+    def close(proc):
+        try:
+            proc.stdin.close()
+        except BrokenPipeError:
+            # ffmpeg exited with frames left to flush, its errors tell why
+            pass
+        errors = FFmpeg.reap(proc)
+        if proc.returncode != 0:
+            raise Exception("[x] ffmpeg failed (%d): %s" % (
+                proc.returncode, errors.decode("utf-8", errors="ignore").strip()))
+
+    @staticmethod
+    def reap(proc):
+        """ Reads ffmpeg's errors until it exits, then waits on it with wait4, the
+            only way to learn the peak memory of that very process for the metrics """
+        errors = proc.stderr.read()
+        proc.stderr.close()
+        _, status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        Metrics.peak_child(usage.ru_maxrss)
+        return errors
+
+    @staticmethod
+    def probe(file_path):
+        # ffmpeg with no output exits non-zero, but still reports the
+        # container & stream info on stderr, which is all we are after
+        Metrics.count("ffmpeg_processes")
+        proc = subprocess.run(
+            [FFmpeg.binary(), "-hide_banner", "-i", file_path],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+        )
+        infos = proc.stderr.decode("utf-8", errors="ignore")
+        duration = FFmpeg.RE_DURATION.search(infos)
+        video = None
+        for line in infos.splitlines():
+            video = FFmpeg.RE_VIDEO.search(line)
+            if video is not None:
+                fps = FFmpeg.RE_FPS.search(line)
+                video_format = FFmpeg.RE_FORMAT.search(line)
+                break
+        if duration is None or video is None:
+            raise Exception("[x] Unable to probe media info for: " + file_path)
+        hh, mm, ss = duration.groups()
+        return {
+            "duration": int(hh) * 3600 + int(mm) * 60 + float(ss),
+            "codec": video.group(1),
+            "w": int(video.group(2)),
+            "h": int(video.group(3)),
+            "fps": float(fps.group(1)) if fps is not None else None,
+            "profile": video_format.group(1).strip() if video_format is not None else None,
+            "pix_fmt": video_format.group(2) if video_format is not None else None
+        }
+
+    @staticmethod
+    def keyframes(file_path):
+        """ Keyframe timestamps of the first video stream, from a single packet
+            scan (stream copied into framecrc, nothing gets decoded) """
+        Metrics.count("ffmpeg_processes")
+        proc = subprocess.run(
+            [FFmpeg.binary(), "-hide_banner", "-loglevel", "error", "-i", file_path,
+                "-map", "0:v:0", "-c", "copy", "-f", "framecrc", "-"],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        time_base = 1.0
+        keyframes = array("d")
+        for line in proc.stdout.decode("utf-8", errors="ignore").splitlines():
+            if line.startswith("#tb 0:"):
+                num, den = line.split(":")[1].strip().split("/")
+                time_base = float(num) / float(den)
+                continue
+            if line.startswith("#"):
+                continue
+            fields = [i.strip() for i in line.split(",")]
+            # Packet flags are only reported when they differ from a plain keyframe
+            flags = [int(i[2:], 16) for i in fields[6:] if i.startswith("F=")]
+            if len(flags) == 0 or flags[0] & 1:
+                keyframes.append(max(0.0, int(fields[2]) * time_base))
+        return array("d", sorted(keyframes))
+
+    @staticmethod
+    def signatures(file_path, rate, w = 32, h = 18):
+        """ Per sample (`rate` a second) luma mean, luma std dev & mean absolute
+            luma change since the previous sample, off tiny grayscale frames """
+        Metrics.count("ffmpeg_processes")
+        proc = subprocess.run(
+            [FFmpeg.binary(), "-hide_banner", "-loglevel", "error", "-i", file_path, "-map", "0:v:0",
+                "-vf", "fps=%s,scale=%d:%d,format=gray" % (rate, w, h), "-f", "rawvideo", "-"],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        frames = numpy.frombuffer(proc.stdout, dtype=numpy.uint8)
+        frames = frames[:len(frames) - len(frames) % (w * h)].reshape(-1, w * h).astype(numpy.float32)
+        motion = numpy.zeros(len(frames), dtype=numpy.float32)
+        if len(frames) > 1:
+            motion[1:] = numpy.abs(numpy.diff(frames, axis=0)).mean(axis=1)
+        return numpy.stack([frames.mean(axis=1), frames.std(axis=1), motion], axis=1) if len(frames) > 0 else numpy.zeros((0, 3), dtype=numpy.float32)
+
+class Metrics:
+    """ Per stage wall & cpu timers, counters and peak memory, written as one
+        JSON line per phase (scan, plan, render of an iteration). Turned off,
+        every call is a flag check and stages are a shared no-op context """
+    enabled = False
+    path = "./metrics.jsonl"
+    record = None
+    lock = threading.Lock()
+    NULL_STAGE = contextlib.nullcontext()
+
+    @staticmethod
+    def configure(metrics_config):
+        Metrics.enabled = metrics_config is not None and metrics_config["enabled"]
+        if Metrics.enabled:
+            Metrics.path = metrics_config["path"]
+
+    @staticmethod
+    def begin(phase, iteration = None):
+        if not Metrics.enabled:
+            return
+        Metrics.record = { "phase": phase, "iteration": iteration, "pid": os.getpid(), "stages": {}, "counters": {} }
+        Metrics.record["started"] = datetime.now().isoformat()
+        Metrics.restart_peak()
+
+    @staticmethod
+    def restart_peak():
+        """ ru_maxrss is a lifetime maximum, so the process' high water mark is
+            reset (linux) and children are followed one by one as they are reaped """
+        Metrics.record["peak_rss_children_kb"] = 0
+        Metrics.record["children_maxrss_kb"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        try:
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+        except (IOError, OSError):
+            pass
+
+    @staticmethod
+    def peak_rss():
+        """ Peak resident memory (KB) since restart_peak, or of the whole life of the process where unsupported """
+        try:
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1])
+        except (IOError, OSError):
+            pass
+        # ru_maxrss is in KB on linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    @staticmethod
+    def peak_child(kb):
+        if not Metrics.enabled or Metrics.record is None:
+            return
+        with Metrics.lock:
+            Metrics.record["peak_rss_children_kb"] = max(Metrics.record["peak_rss_children_kb"], kb)
+
+    @staticmethod
+    def stage(name):
+        if not Metrics.enabled or Metrics.record is None:
+            return Metrics.NULL_STAGE
+        return Metrics.timed(name)
+
+    @staticmethod
+    @contextlib.contextmanager
+    def timed(name):
+        wall, cpu, children = time.perf_counter(), time.process_time(), os.times()
+        try:
+            yield
+        finally:
+            ended = os.times()
+            Metrics.add_stage(name, {
+                "wall": time.perf_counter() - wall,
+                "cpu": time.process_time() - cpu,
+                "cpu_children": (ended.children_user + ended.children_system) - (children.children_user + children.children_system)
+            })
+
+    @staticmethod
+    def add_stage(name, timings):
+        with Metrics.lock:
+            stage = Metrics.record["stages"].setdefault(name, { "wall": 0.0, "cpu": 0.0, "cpu_children": 0.0, "calls": 0 })
+            for k, v in timings.items():
+                stage[k] = stage[k] + v
+            stage["calls"] = stage["calls"] + 1
+
+    @staticmethod
+    def count(name, n = 1):
+        if not Metrics.enabled or Metrics.record is None:
+            return
+        with Metrics.lock:
+            Metrics.record["counters"][name] = Metrics.record["counters"].get(name, 0) + n
+
+    @staticmethod
+    def detach():
+        """ In a helper process forked mid phase: starts over with an empty record,
+            handed back by collect for the parent to merge into its own """
+        if not Metrics.enabled or Metrics.record is None:
+            return
+        Metrics.record = { "stages": {}, "counters": {} }
+        Metrics.restart_peak()
+
+    @staticmethod
+    def collect():
+        if not Metrics.enabled or Metrics.record is None:
+            return None
+        Metrics.record["peak_rss_kb"] = Metrics.peak_rss()
+        return Metrics.record
+
+    @staticmethod
+    def merge(partial):
+        if partial is None or not Metrics.enabled or Metrics.record is None:
+            return
+        with Metrics.lock:
+            for name, timings in partial["stages"].items():
+                stage = Metrics.record["stages"].setdefault(name, { "wall": 0.0, "cpu": 0.0, "cpu_children": 0.0, "calls": 0 })
+                for k, v in timings.items():
+                    stage[k] = stage[k] + v
+            for name, n in partial["counters"].items():
+                Metrics.record["counters"][name] = Metrics.record["counters"].get(name, 0) + n
+        # the helper process is itself a child of this one
+        Metrics.peak_child(max(partial["peak_rss_kb"], partial["peak_rss_children_kb"]))
+
+    @staticmethod
+    def end(**extra):
+        if not Metrics.enabled or Metrics.record is None:
+            return
+        # children not reaped by FFmpeg.reap (moviepy's) only show up once they outgrow every child before them
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        if children > Metrics.record["children_maxrss_kb"]:
+            Metrics.peak_child(children)
+        record, Metrics.record = Metrics.record, None
+        del record["children_maxrss_kb"]
+        record.update(extra)
+        record["peak_rss_kb"] = Metrics.peak_rss()
+        with open(Metrics.path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    @staticmethod
+    def profiled(metrics_config, iteration, fn, *args):
+        """ Runs fn under a profiler when this is the iteration asked to be profiled """
+        if metrics_config is None or metrics_config["profile"] != iteration:
+            return fn(*args)
+        profile_path = metrics_config["profile_path"] % (iteration)
+        if metrics_config["profiler"] == Config.MET_PROF_PYINSTRUMENT:
+            try:
+                import pyinstrument
+                profiler = pyinstrument.Profiler()
+                profiler.start()
+                try:
+                    return fn(*args)
+                finally:
+                    profiler.stop()
+                    Utils.write_to_file(profile_path + ".html", profiler.output_html())
+            except ImportError:
+                Utils.log(" [i] pyinstrument is not installed, profiling with cProfile instead")
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(fn, *args)
+        finally:
+            profiler.dump_stats(profile_path)
+
+
 class MixerUtils:
     @staticmethod
     def select_width(clip_a, clip_b):
@@ -125,6 +462,29 @@ class MixerUtils:
         [w, h] = (picker[strategy])(clip_a, clip_b)
         return w, h
     
+    @staticmethod
+    def snap_to(keyframes, t, lo, hi):
+        """ Closest keyframe at or before t within [lo, hi], else the first one after it """
+        i = bisect.bisect_right(keyframes, t)
+        if i > 0 and keyframes[i - 1] >= lo:
+            return keyframes[i - 1]
+        if i < len(keyframes) and keyframes[i] <= hi:
+            return keyframes[i]
+        return t
+
+    @staticmethod
+    def dull_share(signatures, content_config, windows):
+        """ Share of the dull samples (dark, flat or still) within every (start, end)
+            window, in seconds """
+        rate = content_config["rate"]
+        dull = (signatures[:, 0] < content_config["luma"]) | (signatures[:, 1] < content_config["detail"]) | (signatures[:, 2] < content_config["motion"])
+        dull_sum = numpy.concatenate([[0], numpy.cumsum(dull)])
+        windows = numpy.asarray(windows, dtype=numpy.float64)
+        first = numpy.clip(numpy.floor(windows[:, 0] * rate).astype(int), 0, len(signatures))
+        last = numpy.clip(numpy.ceil(windows[:, 1] * rate).astype(int), first, len(signatures))
+        samples = last - first
+        return numpy.where(samples > 0, (dull_sum[last] - dull_sum[first]) / numpy.maximum(samples, 1), 0.0)
+
     @staticmethod
     def new_clip_resolution(w, h):
         class ClipResolution:
@@ -157,9 +517,23 @@ class Config:
     C_CLIP = "clip"
     C_FULL = "full"
     C_DEF = C_FULL
+    C_SNAP_KEYFRAME = "keyframe"
+    C_SNAP_NONE = "none"
+    C_SNAP_DEF = C_SNAP_NONE
+    C_CONTENT_NONE = "none"
+    C_CONTENT_REJECT = "reject"
+    C_CONTENT_WEIGHT = "weight"
+    C_CONTENT_DEF = C_CONTENT_NONE
+    C_CONTENT_RATE_DEF = 2              # signature samples a second
+    C_CONTENT_LUMA_DEF = 16             # mean luma (0-255) below which a sample is too dark
+    C_CONTENT_DETAIL_DEF = 4            # luma std dev below which it is a flat slate
+    C_CONTENT_MOTION_DEF = 0.5          # mean luma change below which it is still
+    C_CONTENT_TOLERANCE_DEF = 0.2       # share of dull samples a window may have
+    C_CONTENT_CANDIDATES_DEF = 8
     COMP_UNQ = "unique"
     COMP_GEN = "gen"
     COMP_DEF = COMP_GEN
+    UNQ_RETRIES_DEF = 1000
 
     # -- Constants: Duration & bounds
     DUR_MIN_DEF = -1
@@ -167,6 +541,11 @@ class Config:
     START_DEF = -1
     END_DEF = -1
 
+    # -- Constants: Source library
+    SRC_ROOTS_DEF = ["./"]
+    SRC_RECURSIVE_DEF = False
+    SRC_SAMPLE_DEF = -1
+
     # -- Constants: Export & formats
     OUT_PREFIX_DEF = "moviemixed-"
     FMT_MP4 = "mp4"
@@ -174,6 +553,7 @@ class Config:
 
     # -- Constants: Iterations & stitch behavior
     ITER_DEF = 1
+    SEED_DEF = -1
     ST_MIN_DEF = -1
     ST_MAX_DEF = -1
     
@@ -189,17 +569,68 @@ class Config:
     
     ST_BITRATE_DEF = "5000k"
 
+    ST_ENGINE_MOVIEPY = "moviepy"
+    ST_ENGINE_FFMPEG = "ffmpeg"
+    ST_ENGINE_COPY = "copy"
+    ST_ENGINE_DEF = ST_ENGINE_MOVIEPY
+
+    ST_READERS_DEF = 4
+    ST_CHUNKS_DEF = 1
+    ST_RENDITIONS_DEF = []
+
     ST_STRAT_H_DEF = -1
     ST_STRAT_W_DEF = -1
 
 
+    # -- Constants: Pattern storage
+    STORE_JSON = "json"
+    STORE_SQLITE = "sqlite"
+    STORE_DEF = STORE_SQLITE
+    STORE_BATCH_DEF = 32
+    STORE_BLOOM_DEF = -1
+
+    # -- Constants: Parallel rendering
+    WORKERS_DEF = 1
+    ENCODERS_DEF = -1
+
+    # -- Constants: Cutting
+    CUT_THREADS_DEF = 8
+    CUT_TIMEOUT_DEF = -1
+    CUT_NORMALIZE_DEF = False
+    CACHE_ENABLED_DEF = True
+    CACHE_DIR_DEF = "./patch_cache"
+    CACHE_BUDGET_DEF = 2048     # in MB
+
+    # -- Constants: Preview proxies
+    PROXY_DIR_DEF = "./proxies"
+    PROXY_HEIGHT_DEF = 180
+    PROXY_FPS_DEF = 12
+    PROXY_BITRATE_DEF = "400k"  # of the preview renders
+
+    # -- Constants: Metrics
+    MET_ENABLED_DEF = False
+    MET_PATH_DEF = "./metrics.jsonl"
+    MET_PROFILE_DEF = -1
+    MET_PROF_CPROFILE = "cprofile"
+    MET_PROF_PYINSTRUMENT = "pyinstrument"
+    MET_PROF_DEF = MET_PROF_CPROFILE
+    MET_PROFILE_PATH_DEF = "./profile-%d.prof"
+
+    # -- Constants: Daemon
+    DMN_HOST_DEF = "127.0.0.1"
+    DMN_PORT_DEF = 8420
+    DMN_ENCODERS_DEF = 2
+    DMN_WATCH_DEF = 10      # in seconds
+
     # -- Constants: Other stitch behaviors
     ST_FPS_DEF = 50
     
 
-    def __init__(self):
-        Utils.log("Loading configuration")
-        self.config = Utils.get_file_contents(Config.config_path, parse_json = True)
+    def __init__(self, overrides = None, base = None):
+        if base is None:
+            Utils.log("Loading configuration")
+            base = Utils.get_file_contents(Config.config_path, parse_json = True)
+        self.config = base if overrides is None else Utils.merge(base, overrides)
     
     def mode(self):
         return self.config["mix_mode"] if "mix_mode" in self.config else Config.MX_DEF
@@ -213,9 +644,47 @@ class Config:
     def clipping_mode(self):
         return self.config["clipping"]["mode"] if "clipping" in self.config and "mode" in self.config["clipping"] else Config.C_DEF
     
+    def snap(self):
+        return self.config["clipping"]["snap"] if "clipping" in self.config and "snap" in self.config["clipping"] else Config.C_SNAP_DEF
+
     def compile_pattern(self):
         return self.config["clipping"]["compile"] if "clipping" in self.config and "compile" in self.config["clipping"] else Config.COMP_DEF
     
+    def unique_retries(self):
+        return self.config["clipping"]["retries"] if "clipping" in self.config and "retries" in self.config["clipping"] else Config.UNQ_RETRIES_DEF
+
+    def content_mode(self):
+        return self.config["clipping"]["content"]["mode"] if "clipping" in self.config and "content" in self.config["clipping"] and "mode" in self.config["clipping"]["content"] else Config.C_CONTENT_DEF
+
+    def content_rate(self):
+        return self.config["clipping"]["content"]["rate"] if "clipping" in self.config and "content" in self.config["clipping"] and "rate" in self.config["clipping"]["content"] else Config.C_CONTENT_RATE_DEF
+
+    def content_luma(self):
+        return self.config["clipping"]["content"]["luma"] if "clipping" in self.config and "content" in self.config["clipping"] and "luma" in self.config["clipping"]["content"] else Config.C_CONTENT_LUMA_DEF
+
+    def content_detail(self):
+        return self.config["clipping"]["content"]["detail"] if "clipping" in self.config and "content" in self.config["clipping"] and "detail" in self.config["clipping"]["content"] else Config.C_CONTENT_DETAIL_DEF
+
+    def content_motion(self):
+        return self.config["clipping"]["content"]["motion"] if "clipping" in self.config and "content" in self.config["clipping"] and "motion" in self.config["clipping"]["content"] else Config.C_CONTENT_MOTION_DEF
+
+    def content_tolerance(self):
+        return self.config["clipping"]["content"]["tolerance"] if "clipping" in self.config and "content" in self.config["clipping"] and "tolerance" in self.config["clipping"]["content"] else Config.C_CONTENT_TOLERANCE_DEF
+
+    def content_candidates(self):
+        return self.config["clipping"]["content"]["candidates"] if "clipping" in self.config and "content" in self.config["clipping"] and "candidates" in self.config["clipping"]["content"] else Config.C_CONTENT_CANDIDATES_DEF
+
+    def export_content(self):
+        exp = {}
+        exp["mode"] = self.content_mode()
+        exp["rate"] = self.content_rate()
+        exp["luma"] = self.content_luma()
+        exp["detail"] = self.content_detail()
+        exp["motion"] = self.content_motion()
+        exp["tolerance"] = self.content_tolerance()
+        exp["candidates"] = self.content_candidates()
+        return exp
+
     def min_duration(self):
         return self.config["clipping"]["duration"]["min"] if "clipping" in self.config and "duration" in self.config["clipping"] and "min" in self.config["clipping"]["duration"] else Config.DUR_MIN_DEF
     
@@ -228,6 +697,15 @@ class Config:
     def end_at(self):
         return self.config["clipping"]["bounds"]["end"] if "clipping" in self.config and "bounds" in self.config["clipping"] and "end" in self.config["clipping"]["bounds"] else Config.END_DEF
 
+    def source_roots(self):
+        return self.config["sources"]["roots"] if "sources" in self.config and "roots" in self.config["sources"] else Config.SRC_ROOTS_DEF
+
+    def source_recursive(self):
+        return self.config["sources"]["recursive"] if "sources" in self.config and "recursive" in self.config["sources"] else Config.SRC_RECURSIVE_DEF
+
+    def source_sample(self):
+        return self.config["sources"]["sample"] if "sources" in self.config and "sample" in self.config["sources"] else Config.SRC_SAMPLE_DEF
+
     def output_prefix(self):
         return self.config["output_prefix"] if "output_prefix" in self.config else Config.OUT_PREFIX_DEF
     
@@ -237,6 +715,106 @@ class Config:
     def iterations(self):
         return self.config["iterations"] if "iterations" in self.config else Config.ITER_DEF
 
+    def seed(self):
+        return self.config["seed"] if "seed" in self.config else Config.SEED_DEF
+
+    def storage_backend(self):
+        return self.config["storage"]["backend"] if "storage" in self.config and "backend" in self.config["storage"] else Config.STORE_DEF
+
+    def storage_batch(self):
+        return self.config["storage"]["batch"] if "storage" in self.config and "batch" in self.config["storage"] else Config.STORE_BATCH_DEF
+
+    def storage_bloom(self):
+        return self.config["storage"]["bloom"] if "storage" in self.config and "bloom" in self.config["storage"] else Config.STORE_BLOOM_DEF
+
+    def workers(self):
+        return self.config["workers"] if "workers" in self.config else Config.WORKERS_DEF
+
+    def encoders(self):
+        return self.config["encoders"] if "encoders" in self.config else Config.ENCODERS_DEF
+
+    def cut_threads(self):
+        return self.config["cutting"]["threads"] if "cutting" in self.config and "threads" in self.config["cutting"] else Config.CUT_THREADS_DEF
+
+    def cut_timeout(self):
+        return self.config["cutting"]["timeout"] if "cutting" in self.config and "timeout" in self.config["cutting"] else Config.CUT_TIMEOUT_DEF
+
+    def cut_normalize(self):
+        return self.config["cutting"]["normalize"] if "cutting" in self.config and "normalize" in self.config["cutting"] else Config.CUT_NORMALIZE_DEF
+
+    def patch_cache_enabled(self):
+        return self.config["cutting"]["cache"]["enabled"] if "cutting" in self.config and "cache" in self.config["cutting"] and "enabled" in self.config["cutting"]["cache"] else Config.CACHE_ENABLED_DEF
+
+    def patch_cache_dir(self):
+        return self.config["cutting"]["cache"]["dir"] if "cutting" in self.config and "cache" in self.config["cutting"] and "dir" in self.config["cutting"]["cache"] else Config.CACHE_DIR_DEF
+
+    def patch_cache_budget(self):
+        return self.config["cutting"]["cache"]["budget"] if "cutting" in self.config and "cache" in self.config["cutting"] and "budget" in self.config["cutting"]["cache"] else Config.CACHE_BUDGET_DEF
+
+    def export_cutting(self):
+        exp = {}
+        exp["threads"] = self.cut_threads()
+        exp["timeout"] = self.cut_timeout()
+        exp["cache"] = None
+        if self.patch_cache_enabled():
+            exp["cache"] = {}
+            exp["cache"]["dir"] = self.patch_cache_dir()
+            exp["cache"]["budget"] = self.patch_cache_budget()
+        return exp
+
+    def proxy_dir(self):
+        return self.config["proxy"]["dir"] if "proxy" in self.config and "dir" in self.config["proxy"] else Config.PROXY_DIR_DEF
+
+    def proxy_height(self):
+        return self.config["proxy"]["height"] if "proxy" in self.config and "height" in self.config["proxy"] else Config.PROXY_HEIGHT_DEF
+
+    def proxy_fps(self):
+        return self.config["proxy"]["fps"] if "proxy" in self.config and "fps" in self.config["proxy"] else Config.PROXY_FPS_DEF
+
+    def proxy_bitrate(self):
+        return self.config["proxy"]["bitrate"] if "proxy" in self.config and "bitrate" in self.config["proxy"] else Config.PROXY_BITRATE_DEF
+
+    def export_proxy(self):
+        exp = {}
+        exp["dir"] = self.proxy_dir()
+        exp["height"] = self.proxy_height()
+        exp["fps"] = self.proxy_fps()
+        exp["bitrate"] = self.proxy_bitrate()
+        return exp
+
+    def metrics_enabled(self):
+        return self.config["metrics"]["enabled"] if "metrics" in self.config and "enabled" in self.config["metrics"] else Config.MET_ENABLED_DEF
+
+    def metrics_path(self):
+        return self.config["metrics"]["path"] if "metrics" in self.config and "path" in self.config["metrics"] else Config.MET_PATH_DEF
+
+    def profile_iteration(self):
+        return self.config["metrics"]["profile"] if "metrics" in self.config and "profile" in self.config["metrics"] else Config.MET_PROFILE_DEF
+
+    def profiler(self):
+        return self.config["metrics"]["profiler"] if "metrics" in self.config and "profiler" in self.config["metrics"] else Config.MET_PROF_DEF
+
+    def export_metrics(self):
+        exp = {}
+        exp["enabled"] = self.metrics_enabled()
+        exp["path"] = self.metrics_path()
+        exp["profile"] = self.profile_iteration()
+        exp["profiler"] = self.profiler()
+        exp["profile_path"] = Config.MET_PROFILE_PATH_DEF
+        return exp
+
+    def daemon_host(self):
+        return self.config["daemon"]["host"] if "daemon" in self.config and "host" in self.config["daemon"] else Config.DMN_HOST_DEF
+
+    def daemon_port(self):
+        return self.config["daemon"]["port"] if "daemon" in self.config and "port" in self.config["daemon"] else Config.DMN_PORT_DEF
+
+    def daemon_encoders(self):
+        return self.config["daemon"]["encoders"] if "daemon" in self.config and "encoders" in self.config["daemon"] else Config.DMN_ENCODERS_DEF
+
+    def daemon_watch(self):
+        return self.config["daemon"]["watch"] if "daemon" in self.config and "watch" in self.config["daemon"] else Config.DMN_WATCH_DEF
+
     def min_stitch_duration(self):
         return self.config["stitch"]["duration"]["min"] if "stitch" in self.config and "duration" in self.config["stitch"] and "min" in self.config["stitch"]["duration"] else Config.ST_MIN_DEF
 
@@ -260,15 +838,47 @@ class Config:
     def bitrate(self):
         return self.config["stitch"]["frames"]["bitrate"] if "stitch" in self.config and "frames" in self.config["stitch"] and "bitrate" in self.config["stitch"]["frames"] else Config.ST_BITRATE_DEF
 
+    def stitch_engine(self):
+        return self.config["stitch"]["engine"] if "stitch" in self.config and "engine" in self.config["stitch"] else Config.ST_ENGINE_DEF
+
+    def stitch_readers(self):
+        return self.config["stitch"]["readers"] if "stitch" in self.config and "readers" in self.config["stitch"] else Config.ST_READERS_DEF
+
+    def stitch_chunks(self):
+        return self.config["stitch"]["chunks"] if "stitch" in self.config and "chunks" in self.config["stitch"] else Config.ST_CHUNKS_DEF
+
     def filler(self):
         return self.config["filler"] if "filler" in self.config else Config.FILL_DEF
 
+    def stitch_renditions(self):
+        return self.config["stitch"]["renditions"] if "stitch" in self.config and "renditions" in self.config["stitch"] else Config.ST_RENDITIONS_DEF
+
+    def export_renditions(self):
+        """ Every extra rendition as its output suffix, w, h, fps & bitrate, the
+            latter two falling back to the main output's """
+        renditions = []
+        for idx, each_rendition in enumerate(self.stitch_renditions()):
+            resolution = each_rendition["resolution"] if "resolution" in each_rendition else {}
+            renditions.append({
+                "suffix": each_rendition["name"] if "name" in each_rendition else "r%d" % (idx),
+                "w": resolution["w"] if "w" in resolution else -1,
+                "h": resolution["h"] if "h" in resolution else -1,
+                "fps": each_rendition["fps"] if "fps" in each_rendition else self.fps(),
+                "bitrate": each_rendition["bitrate"] if "bitrate" in each_rendition else self.bitrate()
+            })
+        return renditions
+
     def export_stitch(self, resolution = None):
         exp = {}
         exp["strategy"] = self.stitch_strategy()
         exp["min_duration"] = self.min_stitch_duration()
         exp["fps"] = self.fps()
         exp["bitrate"] = self.bitrate()
+        exp["engine"] = self.stitch_engine()
+        exp["readers"] = self.stitch_readers()
+        exp["chunks"] = self.stitch_chunks()
+        exp["normalize"] = self.cut_normalize()
+        exp["renditions"] = self.export_renditions()
         exp["resolution"] = {}
         exp["resolution"]["w"] = Config.ST_STRAT_W_DEF
         exp["resolution"]["h"] = Config.ST_STRAT_H_DEF
@@ -287,6 +897,12 @@ class Storage:
             Utils.create_file( file_path = Storage.config_path, default_contents = "{}")
         self.config = Utils.get_file_contents(Storage.config_path, True)
     
+    @staticmethod
+    def open(config):
+        if config.storage_backend() == Config.STORE_SQLITE:
+            return SqliteStorage(config.storage_batch(), config.storage_bloom())
+        return Storage()
+
     def export(self):
         Utils.write_to_file(Storage.config_path, json.dumps(self.config))
     
@@ -297,9 +913,434 @@ class Storage:
     def key_exists(self, k):
         return k in self.config
 
+    def count(self):
+        return len(self.config)
+
+    def close(self):
+        pass
+
+
+class BloomFilter:
+    """ Fixed size probabilistic set: no false negatives, and about `error_rate`
+        false positives once `capacity` keys are in """
+    def __init__(self, capacity, error_rate = 0.01):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, k):
+        digest = hashlib.sha1(k.encode("utf-8")).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:16], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, k):
+        for i in self.positions(k):
+            self.bits[i >> 3] |= 1 << (i & 7)
+
+    def __contains__(self, k):
+        return all(self.bits[i >> 3] & (1 << (i & 7)) for i in self.positions(k))
+
+
+class SqliteStorage:
+    """ Pattern store backed by an indexed sqlite table: an insert costs the same
+        however long the history is, and nothing gets loaded upfront """
+    config_path = "./store.sqlite"
+    def __init__(self, batch = 32, bloom = Config.STORE_BLOOM_DEF):
+        Utils.log("Loading storage (sqlite)")
+        self.lock = threading.Lock()
+        self.batch = max(1, batch)
+        self.pending = 0
+        self.db = sqlite3.connect(SqliteStorage.config_path, check_same_thread=False)
+        # WAL keeps every commit atomic, NORMAL only syncs at checkpoints: a crash
+        # can lose the last uncommitted batch, never corrupt the store
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS patterns (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID")
+        self.db.execute("CREATE TABLE IF NOT EXISTS bloom (id INTEGER PRIMARY KEY, capacity INTEGER, keys INTEGER, bits BLOB)")
+        self.db.commit()
+        self.migrate()
+        self.bloom = None
+        self.bloom_keys = 0
+        if bloom != Config.STORE_BLOOM_DEF:
+            self.load_bloom(int(bloom))
+        else:
+            # patterns stored without the filter would make a kept one lie
+            self.db.execute("DELETE FROM bloom")
+            self.db.commit()
+        atexit.register(self.close)
+
+    def load_bloom(self, capacity):
+        """ Loads the filter persisted along with the patterns, only going over
+            the whole history when there is none yet or it has outgrown it """
+        row = self.db.execute("SELECT capacity, keys, bits FROM bloom WHERE id = 0").fetchone()
+        if row is not None and row[0] >= capacity and row[1] <= row[0]:
+            self.bloom = BloomFilter(row[0])
+            self.bloom.bits = bytearray(row[2])
+            self.bloom_keys = row[1]
+            return
+        Utils.log(" - Building the bloom filter over the pattern history")
+        self.bloom_keys = self.count()
+        self.bloom = BloomFilter(max(capacity, 2 * self.bloom_keys))
+        for (k,) in self.db.execute("SELECT key FROM patterns"):
+            self.bloom.add(k)
+        self.commit()
+
+    def commit(self):
+        # the filter goes in the same transaction as the patterns it covers
+        if self.bloom is not None:
+            self.db.execute(
+                "INSERT OR REPLACE INTO bloom (id, capacity, keys, bits) VALUES (0, ?, ?, ?)",
+                (self.bloom.capacity, self.bloom_keys, bytes(self.bloom.bits))
+            )
+        self.db.commit()
+        self.pending = 0
+
+    def migrate(self):
+        # one time import of the history kept by the json storage
+        if self.db.execute("SELECT 1 FROM patterns LIMIT 1").fetchone() is not None or not Utils.file_exists(Storage.config_path):
+            return
+        history = Utils.get_file_contents(Storage.config_path, True)
+        if len(history) == 0:
+            return
+        Utils.log(" - Importing (%d) patterns from (%s)" % (len(history), Storage.config_path))
+        self.db.executemany(
+            "INSERT OR REPLACE INTO patterns (key, value) VALUES (?, ?)",
+            [(k, json.dumps(v)) for k, v in history.items()]
+        )
+        self.db.commit()
+
+    def export(self):
+        with self.lock:
+            self.commit()
+
+    def store(self, k, v):
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO patterns (key, value) VALUES (?, ?)", (k, json.dumps(v)))
+            if self.bloom is not None:
+                self.bloom.add(k)
+                self.bloom_keys = self.bloom_keys + 1
+            self.pending = self.pending + 1
+            if self.pending >= self.batch:
+                self.commit()
+
+    def key_exists(self, k):
+        if self.bloom is not None and k not in self.bloom:
+            return False
+        with self.lock:
+            return self.db.execute("SELECT 1 FROM patterns WHERE key = ?", (k,)).fetchone() is not None
+
+    def count(self):
+        return self.db.execute("SELECT COUNT(*) FROM patterns").fetchone()[0]
+
+    def close(self):
+        if self.db is not None:
+            self.export()
+            self.db.close()
+            self.db = None
+
+
+class MediaIndex:
+    index_path = "./media_index.json"
+    def __init__(self):
+        Utils.log("Loading media index")
+        if not Utils.file_exists( file_path = MediaIndex.index_path, check_writable=True):
+            Utils.create_file( file_path = MediaIndex.index_path, default_contents = "{}")
+        self.index = Utils.get_file_contents(MediaIndex.index_path, True)
+        self.dirty = False
+
+    @staticmethod
+    def fingerprint(file_path):
+        stat = os.stat(file_path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def export(self):
+        if self.dirty:
+            Utils.write_to_file(MediaIndex.index_path, json.dumps(self.index))
+            self.dirty = False
+
+    def get(self, file_path):
+        """ Returns the probed metadata for the file, probing it again only
+            if its size or mtime has changed since the last probe """
+        size, mtime = MediaIndex.fingerprint(file_path)
+        entry = self.index.get(file_path)
+        # entries indexed before the pixel format was probed get probed again
+        if entry is not None and entry["size"] == size and entry["mtime"] == mtime and "pix_fmt" in entry:
+            return entry
+        Utils.log(" - Probing (%s)" % (file_path))
+        entry = FFmpeg.probe(file_path)
+        entry["size"] = size
+        entry["mtime"] = mtime
+        self.index[file_path] = entry
+        self.dirty = True
+        return entry
+
+    def keyframes(self, file_path):
+        entry = self.get(file_path)
+        if "keyframes" not in entry:
+            Utils.log(" - Indexing keyframes of (%s)" % (file_path))
+            entry["keyframes"] = base64.b64encode(FFmpeg.keyframes(file_path).tobytes()).decode("ascii")
+            self.dirty = True
+        keyframes = array("d")
+        keyframes.frombytes(base64.b64decode(entry["keyframes"]))
+        return keyframes
+
+    def signatures(self, file_path, rate):
+        entry = self.get(file_path)
+        if "signatures" not in entry or entry["signatures"]["rate"] != rate:
+            Utils.log(" - Analysing frames of (%s)" % (file_path))
+            entry["signatures"] = {
+                "rate": rate,
+                "data": base64.b64encode(FFmpeg.signatures(file_path, rate).astype(numpy.float32).tobytes()).decode("ascii")
+            }
+            self.dirty = True
+        return numpy.frombuffer(base64.b64decode(entry["signatures"]["data"]), dtype=numpy.float32).reshape(-1, 3)
+
+    def refresh(self, file_paths):
+        for each_file in file_paths:
+            self.get(each_file)
+        for each_file in [i for i in self.index if not os.path.isfile(i)]:
+            del self.index[each_file]
+            self.dirty = True
+        self.export()
+
+
+class SourceLibrary:
+    """ Index of the source files under a set of roots. A rescan only lists the
+        directories whose mtime changed since the last one, the others are
+        served from the persisted index """
+    index_path = "./library_index.json"
+    def __init__(self, roots, working_format, recursive = False, exclude = []):
+        self.roots = [os.path.normpath(i) for i in roots]
+        self.format = working_format
+        self.recursive = recursive
+        self.exclude = set(os.path.abspath(i) for i in exclude)
+        self.index = { "format": working_format, "dirs": {} }
+        if Utils.file_exists(SourceLibrary.index_path, check_readable=True):
+            index = Utils.get_file_contents(SourceLibrary.index_path, True)
+            # files were filtered by format, another format needs a fresh index
+            if index.get("format") == working_format:
+                self.index = index
+        self.dirty = False
+
+    def export(self):
+        if self.dirty:
+            Utils.write_to_file(SourceLibrary.index_path, json.dumps(self.index))
+            self.dirty = False
+
+    def scan(self):
+        Utils.log(" - Scanning (%s)%s" % (", ".join(self.roots), " recursively" if self.recursive else ""))
+        seen = set()
+        for each_root in self.roots:
+            pending = [each_root]
+            while len(pending) > 0:
+                dir_path = pending.pop()
+                seen.add(dir_path)
+                entry = self.scan_dir(dir_path)
+                if self.recursive:
+                    pending.extend(os.path.normpath(os.path.join(dir_path, i)) for i in entry["dirs"])
+        for each_dir in [i for i in self.index["dirs"] if i not in seen]:
+            del self.index["dirs"][each_dir]
+            self.dirty = True
+        self.export()
+
+    def scan_dir(self, dir_path):
+        mtime = os.stat(dir_path).st_mtime_ns
+        entry = self.index["dirs"].get(dir_path)
+        if entry is not None and entry["mtime"] == mtime:
+            return entry
+        entry = { "mtime": mtime, "files": [], "dirs": [] }
+        with os.scandir(dir_path) as it:
+            for each_entry in it:
+                if each_entry.name.startswith("."):
+                    continue
+                if each_entry.is_dir():
+                    if os.path.abspath(each_entry.path) not in self.exclude:
+                        entry["dirs"].append(each_entry.name)
+                elif each_entry.is_file() and each_entry.name.endswith(self.format):
+                    entry["files"].append(each_entry.name)
+        entry["files"].sort()
+        entry["dirs"].sort()
+        self.index["dirs"][dir_path] = entry
+        self.dirty = True
+        return entry
+
+    def files(self):
+        for dir_path in sorted(self.index["dirs"]):
+            for each_file in self.index["dirs"][dir_path]["files"]:
+                yield os.path.normpath(os.path.join(dir_path, each_file))
+
+    def sample(self, k, draw = randint):
+        """ k files picked uniformly out of the library, in a single pass that
+            only ever holds k of them (reservoir sampling) """
+        picked = []
+        for i, each_file in enumerate(self.files()):
+            if i < k:
+                picked.append(each_file)
+                continue
+            j = draw(0, i)
+            if j < k:
+                picked[j] = each_file
+        return picked
+
+
+class PatchCache:
+    """ Content addressed store of cut patches, shared by every render on the box.
+        Entries are written atomically & evicted least recently used first, once
+        the cache outgrows its disk budget """
+
+    @staticmethod
+    def key(clip_config, export_config):
+        size, mtime = MediaIndex.fingerprint(clip_config["name"])
+        key = [os.path.abspath(clip_config["name"]), size, mtime, clip_config["start_at"], clip_config["end_at"]]
+        if export_config["normalize"]:
+            # only normalized cuts get encoded, a stream copy is the same bytes whatever the plan
+            key = key + [
+                export_config["resolution"]["w"], export_config["resolution"]["h"], export_config["fps"],
+                export_config.get("canvas"), export_config["bitrate"]
+            ]
+        return hashlib.sha1(json.dumps(key).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def entry_path(cache_config, key):
+        return cache_config["dir"] + "/" + key + ".patch"
+
+    @staticmethod
+    def place(src, dst):
+        # a hard link is free, copying is only for when the cache sits on another device
+        if os.path.lexists(dst):
+            os.unlink(dst)
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copyfile(src, dst)
+
+    @staticmethod
+    def fetch(cache_config, key, target):
+        entry = PatchCache.entry_path(cache_config, key)
+        try:
+            PatchCache.place(entry, target)
+            os.utime(entry)
+        except (IOError, OSError):
+            # missing, or evicted by another render meanwhile
+            return False
+        return True
+
+    @staticmethod
+    def admit(cache_config, key, patch_path):
+        os.makedirs(cache_config["dir"], exist_ok=True)
+        staging = PatchCache.entry_path(cache_config, key) + ".%d-%d.tmp" % (os.getpid(), threading.get_ident())
+        PatchCache.place(patch_path, staging)
+        os.replace(staging, PatchCache.entry_path(cache_config, key))
+        PatchCache.evict(cache_config)
+
+    @staticmethod
+    def evict(cache_config):
+        budget = cache_config["budget"] * 1024 * 1024
+        entries = []
+        with os.scandir(cache_config["dir"]) as it:
+            for each_entry in it:
+                if each_entry.name.endswith(".patch"):
+                    try:
+                        stat = each_entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, each_entry.path))
+        total = sum(i[1] for i in entries)
+        for _, size, path in sorted(entries):
+            if total <= budget:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            total = total - size
+
+
+class ProxyCache:
+    """ Small, low fps, all intra copies of the sources, made once & cut from by
+        the preview renders. Keyed on the source's fingerprint, so that an edited
+        source gets a fresh proxy """
+
+    @staticmethod
+    def path(proxy_config, name):
+        size, mtime = MediaIndex.fingerprint(name)
+        key = hashlib.sha1(json.dumps([
+            os.path.abspath(name), size, mtime, proxy_config["height"], proxy_config["fps"]
+        ]).encode("utf-8")).hexdigest()
+        return proxy_config["dir"] + "/" + key + "." + name.split(".")[-1]
+
+    @staticmethod
+    def ensure(proxy_config, name, size, timeout = None):
+        target = ProxyCache.path(proxy_config, name)
+        if Utils.file_exists(target):
+            return target
+        Utils.log(" - Making a proxy of (%s)" % (name))
+        os.makedirs(proxy_config["dir"], exist_ok=True)
+        staging = target + ".%d-%d.tmp." % (os.getpid(), threading.get_ident()) + name.split(".")[-1]
+        # every frame a keyframe: any cut is exact & a stream copy
+        FFmpeg.run([
+            "-i", name, "-map", "0:v:0",
+            "-vf", "scale=-2:%d,setsar=1,fps=%d" % (min(proxy_config["height"], size[1]), proxy_config["fps"]),
+            "-c:v", Tailor.CODEC, "-g", "1", "-q:v", "5", "-pix_fmt", "yuv420p", "-an", staging
+        ], timeout = timeout)
+        os.replace(staging, target)
+        return target
+
+
+class ReaderPool:
+    """ Hands out a single clip per distinct patch, however many times it is
+        looped over, while keeping at most `max_open` ffmpeg readers alive.
+        An evicted reader is simply reopened by moviepy on its next frame """
+    def __init__(self, max_open):
+        self.max_open = max(1, max_open)
+        self.clips = {}
+        self.sources = {}
+        self.open = collections.OrderedDict()
+
+    def clip(self, file_path, prepare = None):
+        if file_path not in self.clips:
+            Metrics.count("ffmpeg_processes")
+            # patches keep their audio, which the output never has: no reader for it
+            source = VideoFileClip(file_path, audio=False)
+            reader = source.reader
+            source.make_frame = lambda t: self.frame(file_path, reader, t)
+            self.sources[file_path] = source
+            self.clips[file_path] = prepare(source) if prepare is not None else source
+            self.touch(file_path)
+        return self.clips[file_path]
+
+    def frame(self, file_path, reader, t):
+        self.touch(file_path)
+        if reader.proc is None:
+            Metrics.count("ffmpeg_processes")
+        with Metrics.stage("decode"):
+            return reader.get_frame(t)
+
+    def touch(self, file_path):
+        self.open[file_path] = True
+        self.open.move_to_end(file_path)
+        while len(self.open) > self.max_open:
+            evicted, _ = self.open.popitem(last=False)
+            self.sources[evicted].reader.close()
+
+    def close(self):
+        for each_source in self.sources.values():
+            each_source.close()
+        self.clips = {}
+        self.sources = {}
+        self.open.clear()
+
 
 class Tailor:
     CLIP_PREFIX = "tailor_clip-"
+    CHUNK_PREFIX = "tailor_chunk-"
+    CODEC = "mpeg4"
+    # shorter chunks overshoot the bitrate more, each one's rate control starting cold
+    CHUNK_MIN_DURATION = 30
+    # set in chunk processes, which get held to the bitrate over windows of a second
+    bounded_rate = False
 
     @staticmethod
     def resize_patch(strategy, clip, to):
@@ -309,30 +1350,76 @@ class Tailor:
             return clip.resize(height = to.h)
         if strategy == Config.ST_STRAT_WIDTH:
             return clip.resize(width = to.w)
+        if strategy == Config.ST_STRAT_CUSTOM:
+            # fit into the custom resolution, as the ffmpeg engine & normalized cuts do
+            return clip.resize(newsize = Tailor.scaled_size(strategy, clip.size, to))
         return clip
 
     @staticmethod
-    def cut_patches(clip_config, temp_dir):
+    def cut_patches(clip_config, temp_dir, timeout = None, cache_config = None, export_config = None, clip_size = None):
+        target = Tailor.patch_path(temp_dir, clip_config["name"])
+        cache_key = None
+        if cache_config is not None:
+            cache_key = PatchCache.key(clip_config, export_config)
+            if PatchCache.fetch(cache_config, cache_key, target):
+                Utils.log(" [Tailor] Reusing cached patch from (%s)" % ( clip_config["name"]))
+                Metrics.count("patch_cache_hits")
+                return
+
         Utils.log(" [Tailor] Cutting patch from (%s)" % ( clip_config["name"]))
-        ffmpeg_extract_subclip(
-            clip_config["name"], 
-            clip_config["start_at"], clip_config["end_at"],
-            targetname = temp_dir + "/" + Tailor.CLIP_PREFIX + clip_config["name"]
-        )
+        FFmpeg.run([
+            "-ss", FFmpeg.timestamp(clip_config["start_at"]),
+            "-i", clip_config["name"],
+            "-t", FFmpeg.timestamp(clip_config["end_at"] - clip_config["start_at"])
+        ] + Tailor.cut_codec(export_config, clip_size) + [target], timeout = timeout)
+        Metrics.count("patch_bytes", os.path.getsize(target))
+        if cache_key is not None:
+            PatchCache.admit(cache_config, cache_key, target)
 
     @staticmethod
-    def stitch_patches(
-        clips_config, temp_dir, expected_duration, export_config, output_name, output_dir = "."):
-        
-        Utils.log(" [Tailor] Stitching together patches")
+    def cut_codec(export_config, clip_size):
+        if export_config is None or not export_config["normalize"]:
+            return ["-map", "0", "-vcodec", "copy", "-acodec", "copy"]
+        # decode, scale, pad & resample once here, so that the stitch gets
+        # uniform patches already in their final encoding
+        preferred_resolution = MixerUtils.new_clip_resolution(
+            export_config["resolution"]["w"], export_config["resolution"]["h"])
+        w, h = Tailor.scaled_size(export_config["strategy"], clip_size, preferred_resolution)
+        canvas_w, canvas_h = export_config["canvas"]
+        return [
+            "-map", "0:v:0",
+            "-vf", "scale=%d:%d,setsar=1,pad=%d:%d:(ow-iw)/2:(oh-ih)/2,fps=%d" % (
+                w, h, canvas_w, canvas_h, int(export_config["fps"])),
+            "-c:v", Tailor.CODEC, "-b:v", export_config["bitrate"],
+            "-pix_fmt", "yuv420p", "-an"
+        ]
 
-        resolution_strategy = export_config["strategy"]
-        preferred_resolution = MixerUtils.new_clip_resolution(export_config["resolution"]["w"], ["h"])
-        min_duration = export_config["min_duration"]
-        fps = int(export_config["fps"])
-        bitrate = export_config["bitrate"]
+    @staticmethod
+    def cut_all(clips_config, temp_dir, cutting_config, export_config, clip_sizes = None):
+        """ Cuts every patch over a bounded pool of threads, each cut being an
+            ffmpeg subprocess. Results come back in order, the first failure is raised """
+        timeout = None if cutting_config["timeout"] == Config.CUT_TIMEOUT_DEF else cutting_config["timeout"]
+        with concurrent.futures.ThreadPoolExecutor(max_workers = max(1, cutting_config["threads"])) as pool:
+            return list(pool.map(
+                lambda i: Tailor.cut_patches(
+                    i, temp_dir, timeout, cutting_config["cache"], export_config,
+                    clip_sizes[i["name"]] if clip_sizes is not None else None
+                ),
+                clips_config
+            ))
 
-        patches = [temp_dir + "/" + Tailor.CLIP_PREFIX + i["name"] for i in clips_config]
+    @staticmethod
+    def patch_path(temp_dir, name):
+        if os.path.basename(name) == name:
+            return temp_dir + "/" + Tailor.CLIP_PREFIX + name
+        # subjects from nested library dirs get a flat, yet unique, patch name
+        return temp_dir + "/" + Tailor.CLIP_PREFIX + hashlib.md5(name.encode("utf-8")).hexdigest()[:12] + "-" + os.path.basename(name)
+
+    @staticmethod
+    def lay_out(clips_config, expected_duration, min_duration):
+        """ Returns the ordered list of patch names making up the final piece,
+            looping over the patches till the min duration is satisfied """
+        patches = [i["name"] for i in clips_config]
         
         # now if we are short of the min duration, then we need to loop & add till 
         # we satisfy the min length requirement
@@ -341,39 +1428,417 @@ class Tailor:
             Utils.log(" [Tailor] Ensuring your attire is of appropriate length")
             while expected_duration < min_duration:
                 # Utils.log("i is %d and exp dur is: %d and min dur is %d" % (i, expected_duration, min_duration))
-                patches.append(temp_dir + "/" + Tailor.CLIP_PREFIX + clips_config[i]["name"])
+                patches.append(clips_config[i]["name"])
                 expected_duration = expected_duration + clips_config[i]["duration"]
                 i = (i+1) % len(clips_config)
             Utils.log(" [Tailor] ...done, This combination should look perfect!")
+        return patches
+
+    @staticmethod
+    def stitch_patches(
+        clips_config, temp_dir, expected_duration, export_config, output_name, output_dir = ".", clip_sizes = None):
+        
+        Utils.log(" [Tailor] Stitching together patches")
+        patches = Tailor.lay_out(clips_config, expected_duration, export_config["min_duration"])
+        engines = {
+            Config.ST_ENGINE_MOVIEPY: Tailor.stitch_moviepy,
+            Config.ST_ENGINE_FFMPEG: Tailor.stitch_ffmpeg,
+            Config.ST_ENGINE_COPY: Tailor.stitch_copy
+        }
+        engine = export_config["engine"]
+        if export_config["normalize"] and engine == Config.ST_ENGINE_FFMPEG:
+            # patches already are in their final shape & encoding: just chain them
+            engine = Config.ST_ENGINE_COPY
+        chunked = export_config["chunks"] > 1 and engine != Config.ST_ENGINE_COPY and len(patches) > 1
+        if chunked:
+            durations = {i["name"]: i["duration"] for i in clips_config}
+            Tailor.stitch_chunked(
+                engines[engine], patches, durations, temp_dir, export_config, output_dir + "/" + output_name, clip_sizes
+            )
+        else:
+            (engines[engine])(
+                patches, temp_dir, export_config, output_dir + "/" + output_name, clip_sizes
+            )
+        renditions = export_config.get("renditions", [])
+        if len(renditions) > 0 and engine == Config.ST_ENGINE_COPY:
+            # the encoding engines fan the raw frames out to the renditions as
+            # they go, a stream copy has none: its output gets decoded once
+            Tailor.fan_out(output_dir + "/" + output_name, renditions)
+        Utils.log(" [Tailor] Its done!")
+
+    @staticmethod
+    def split_chunks(patches, durations, chunks):
+        """ Splits the laid out patches into at most `chunks` consecutive runs of
+            about the same duration, only ever cutting at patch boundaries """
+        total = sum(durations[i] for i in patches)
+        chunks = max(1, min(chunks, len(patches), int(total // Tailor.CHUNK_MIN_DURATION)))
+        segments = [[]]
+        elapsed = 0
+        for i, name in enumerate(patches):
+            remaining = len(patches) - i
+            boundary = total * len(segments) / chunks
+            if len(segments[-1]) > 0 and len(segments) < chunks and (elapsed >= boundary or remaining <= chunks - len(segments)):
+                segments.append([])
+            segments[-1].append(name)
+            elapsed = elapsed + durations[name]
+        return segments
+
+    @staticmethod
+    def stitch_chunked(stitch, patches, durations, temp_dir, export_config, output_path, clip_sizes):
+        """ Encodes the timeline as consecutive segments in parallel processes, with
+            identical encoder settings & canvas, then joins them by stream copy """
+        segments = Tailor.split_chunks(patches, durations, export_config["chunks"])
+        if len(segments) == 1:
+            return stitch(patches, temp_dir, export_config, output_path, clip_sizes)
+        chunk_config = dict(export_config)
+        if not export_config["normalize"]:
+            # every segment has to land on the canvas the whole timeline would have
+            chunk_config["canvas"] = Tailor.canvas_size(
+                export_config["strategy"], [clip_sizes[i] for i in set(patches)],
+                MixerUtils.new_clip_resolution(export_config["resolution"]["w"], export_config["resolution"]["h"]),
+                compose = export_config["engine"] == Config.ST_ENGINE_MOVIEPY
+            )
+        chunk_paths = [temp_dir + "/" + Tailor.CHUNK_PREFIX + "%d.%s" % (i, output_path.split(".")[-1]) for i in range(len(segments))]
+        # the render holds an encode slot already, every other chunk encoder
+        # running alongside needs one of its own
+        spare = Mixer.take_spare_encode_slots(len(segments) - 1)
+        Utils.log(" [Tailor] Tailoring (%d) pieces, (%d) side by side" % (len(segments), 1 + spare))
+        try:
+            with concurrent.futures.ProcessPoolExecutor(max_workers = 1 + spare) as pool:
+                futures = [
+                    pool.submit(Tailor.stitch_chunk, stitch, segment, temp_dir, chunk_config, chunk_path, clip_sizes)
+                    for segment, chunk_path in zip(segments, chunk_paths)
+                ]
+                for each_future in futures:
+                    Metrics.merge(each_future.result())
+        finally:
+            if Mixer.encode_slots is not None:
+                for _ in range(spare):
+                    Mixer.give_encode_slot()
+        Tailor.concat_copy(chunk_paths, temp_dir + "/" + Tailor.CHUNK_PREFIX + "concat.txt", output_path)
+        # every chunk encoded its share of each rendition, joined the same way
+        for idx, each_rendition in enumerate(export_config.get("renditions", [])):
+            Tailor.concat_copy(
+                [Tailor.rendition_path(i, each_rendition) for i in chunk_paths],
+                temp_dir + "/" + Tailor.CHUNK_PREFIX + "concat-%d.txt" % (idx), Tailor.rendition_path(output_path, each_rendition)
+            )
+
+    @staticmethod
+    def stitch_chunk(stitch, *args):
+        """ Runs in a chunk process, returning its stages & counters, which would otherwise die with it """
+        Metrics.detach()
+        Tailor.bounded_rate = True
+        stitch(*args)
+        return Metrics.collect()
+
+    @staticmethod
+    def stitch_moviepy(patches, temp_dir, export_config, output_path, _):
+        resolution_strategy = export_config["strategy"]
+        preferred_resolution = MixerUtils.new_clip_resolution(export_config["resolution"]["w"], export_config["resolution"]["h"])
+        fps = int(export_config["fps"])
+        bitrate = export_config["bitrate"]
 
         Utils.log(" [Tailor] Ensuring the best get up for you")
-        patches = [Tailor.resize_patch(resolution_strategy, VideoFileClip(i), preferred_resolution) for i in patches]
-        cloth_piece = mp.concatenate_videoclips(patches, method="compose")
+        readers = ReaderPool(export_config["readers"])
+        if export_config["normalize"]:
+            # uniform patches: nothing to resize nor to composite
+            patches = [readers.clip(Tailor.patch_path(temp_dir, i)) for i in patches]
+            cloth_piece = mp.concatenate_videoclips(patches, method="chain")
+        else:
+            patches = [readers.clip(Tailor.patch_path(temp_dir, i), lambda clip: Tailor.resize_patch(resolution_strategy, clip, preferred_resolution)) for i in patches]
+            canvas = export_config.get("canvas")
+            if canvas is None and resolution_strategy == Config.ST_STRAT_CUSTOM and preferred_resolution.w != -1 and preferred_resolution.h != -1:
+                canvas = preferred_resolution.w, preferred_resolution.h
+            if resolution_strategy in [Config.ST_STRAT_WIDTH, Config.ST_STRAT_HEIGHT, Config.ST_STRAT_CUSTOM]:
+                Utils.log(" [Tailor] Adding final touches (compositor)")
+                Tailor.compose(patches, canvas, fps, bitrate, output_path, export_config.get("renditions", []))
+                readers.close()
+                return
+            if export_config.get("canvas") is None:
+                cloth_piece = mp.concatenate_videoclips(patches, method="compose")
+            else:
+                # what a "compose" concatenation does, over a canvas fixed upfront
+                tt = numpy.cumsum([0] + [i.duration for i in patches])
+                cloth_piece = mp.CompositeVideoClip(
+                    [c.set_start(t).set_position("center") for (c, t) in zip(patches, tt)],
+                    size = tuple(export_config["canvas"])
+                )
         
         Utils.log(" [Tailor] Adding final touches")
-        cloth_piece.write_videofile(
-            output_dir + "/" + output_name, 
-            codec="mpeg4",
-            audio=False, verbose=False, 
-            preset="ultrafast", 
-            fps=fps,
-            bitrate=bitrate
+        # the frames write_videofile would encode, piped to an encoder which
+        # also fans them out to the renditions
+        Tailor.encode_frames(
+            cloth_piece.iter_frames(fps=fps, dtype="uint8"), tuple(cloth_piece.size), fps, bitrate,
+            output_path, export_config.get("renditions", [])
         )
-        
-        Utils.log(" [Tailor] Its done!")
         cloth_piece.close()
+        readers.close()
+
+    @staticmethod
+    def compose(patches, canvas, fps, bitrate, output_path, renditions):
+        """ Frame for frame what writing a "compose" concatenation of the patches
+            gives, centred onto a single preallocated canvas which is streamed
+            as is to the encoder """
+        if canvas is None:
+            canvas = max(i.w for i in patches), max(i.h for i in patches)
+        Tailor.encode_frames(Tailor.composed_frames(patches, canvas, fps), canvas, fps, bitrate, output_path, renditions)
+
+    @staticmethod
+    def composed_frames(patches, canvas, fps):
+        canvas_w, canvas_h = canvas
+        frame = numpy.zeros((canvas_h, canvas_w, 3), dtype=numpy.uint8)
+        ends = numpy.cumsum([i.duration for i in patches])
+        starts = numpy.concatenate([[0], ends[:-1]])
+        placed = None
+        for t in numpy.arange(0, ends[-1], 1.0 / fps):
+            idx = int(numpy.searchsorted(ends, t, side="right"))
+            if idx >= len(patches):
+                frame[:] = 0
+                placed = None
+            else:
+                img = patches[idx].get_frame(t - starts[idx])
+                h, w = img.shape[:2]
+                # centred as moviepy does it, cropped if ever larger than the canvas
+                x, y = int((canvas_w - w) / 2), int((canvas_h - h) / 2)
+                if placed != (x, y, w, h):
+                    # the letterbox only needs clearing when the patch changes
+                    frame[:] = 0
+                    placed = (x, y, w, h)
+                frame[max(0, y):min(canvas_h, y + h), max(0, x):min(canvas_w, x + w)] = \
+                    img[max(0, -y):min(h, canvas_h - y), max(0, -x):min(w, canvas_w - x)]
+            yield frame
+
+    @staticmethod
+    def encode_frames(frames, size, fps, bitrate, output_path, renditions):
+        """ Pipes rgb frames to an encoder set up as moviepy's writer would be """
+        encoder = Tailor.open_encoder(output_path, size, fps, bitrate, "rgb24", renditions, preset = "ultrafast")
+        try:
+            for frame in frames:
+                encoder.stdin.write(numpy.ascontiguousarray(frame).data)
+        except IOError:
+            # ffmpeg stopped reading, closing it spells out why
+            FFmpeg.close(encoder)
+            raise
+        except Exception:
+            encoder.kill()
+            encoder.wait()
+            raise
+        FFmpeg.close(encoder)
+
+    @staticmethod
+    def stitch_copy(patches, temp_dir, export_config, output_path, _):
+        # keyframe aligned patches of a single codec & resolution: the concat
+        # demuxer joins them as is, no frame gets decoded or encoded
+        Utils.log(" [Tailor] Adding final touches (stream copy)")
+        Tailor.concat_copy(
+            [Tailor.patch_path(temp_dir, i) for i in patches],
+            temp_dir + "/" + Tailor.CLIP_PREFIX + "concat.txt", output_path
+        )
+
+    @staticmethod
+    def concat_copy(file_paths, list_path, output_path):
+        Utils.write_to_file(list_path, "".join(
+            "file '%s'\n" % (os.path.abspath(i).replace("'", "'\\''")) for i in file_paths
+        ))
+        FFmpeg.run(["-f", "concat", "-safe", "0", "-i", list_path, "-map", "0:v", "-c", "copy", output_path])
+
+    @staticmethod
+    def scaled_size(strategy, size, to):
+        """ Size of a patch once fit to the target resolution as per the strategy """
+        w, h = size
+        if to.w == -1 or to.h == -1:
+            return w, h
+        if strategy == Config.ST_STRAT_HEIGHT:
+            return int(round(w * to.h / h / 2)) * 2, to.h
+        if strategy == Config.ST_STRAT_WIDTH:
+            return to.w, int(round(h * to.w / w / 2)) * 2
+        if strategy == Config.ST_STRAT_CUSTOM:
+            scale = min(to.w / w, to.h / h)
+            return int(round(w * scale / 2)) * 2, int(round(h * scale / 2)) * 2
+        return w, h
+
+    @staticmethod
+    def resized_size(strategy, size, to):
+        """ Size of a patch once through resize_patch, the way moviepy rounds it """
+        w, h = size
+        if to.w == -1 or to.h == -1:
+            return w, h
+        if strategy == Config.ST_STRAT_HEIGHT:
+            return int(w * to.h / h), to.h
+        if strategy == Config.ST_STRAT_WIDTH:
+            return to.w, int(h * to.w / w)
+        if strategy == Config.ST_STRAT_CUSTOM:
+            return Tailor.scaled_size(strategy, size, to)
+        return w, h
+
+    @staticmethod
+    def canvas_size(strategy, sizes, to, compose = False):
+        """ Mirrors the canvas that a "compose" concatenation would end up with,
+            of the moviepy resized patches when `compose` is set. A custom
+            resolution is the canvas, whatever the engine """
+        if strategy == Config.ST_STRAT_CUSTOM and to.w != -1 and to.h != -1:
+            return to.w, to.h
+        if compose:
+            scaled = [Tailor.resized_size(strategy, i, to) for i in sizes]
+            return max(i[0] for i in scaled), max(i[1] for i in scaled)
+        scaled = [Tailor.scaled_size(strategy, i, to) for i in sizes]
+        return max(i[0] for i in scaled), max(i[1] for i in scaled)
+
+    @staticmethod
+    def stitch_ffmpeg(patches, temp_dir, export_config, output_path, clip_sizes):
+        strategy = export_config["strategy"]
+        preferred_resolution = MixerUtils.new_clip_resolution(
+            export_config["resolution"]["w"], export_config["resolution"]["h"])
+        fps = int(export_config["fps"])
+        bitrate = export_config["bitrate"]
+
+        canvas_w, canvas_h = Tailor.canvas_size(strategy, [clip_sizes[i] for i in set(patches)], preferred_resolution)
+        if export_config.get("canvas") is not None:
+            canvas_w, canvas_h = export_config["canvas"]
+
+        Utils.log(" [Tailor] Ensuring the best get up for you (ffmpeg)")
+        # patches are decoded one after the other, each by an ffmpeg of its own
+        # piping raw frames into a single encoder. Only one decoder is ever
+        # alive, so memory stays flat however many times the patches loop
+        encoder = Tailor.open_encoder(output_path, (canvas_w, canvas_h), fps, bitrate, "yuv420p", export_config.get("renditions", []))
+        Utils.log(" [Tailor] Adding final touches")
+        try:
+            for name in patches:
+                w, h = Tailor.scaled_size(strategy, clip_sizes[name], preferred_resolution)
+                FFmpeg.run([
+                    "-i", Tailor.patch_path(temp_dir, name), "-map", "0:v:0",
+                    "-vf", "scale=%d:%d,setsar=1,pad=%d:%d:(ow-iw)/2:(oh-ih)/2,fps=%d,format=yuv420p" % (w, h, canvas_w, canvas_h, fps),
+                    "-f", "rawvideo", "-"
+                ], stdout = encoder.stdin)
+        except Exception:
+            encoder.kill()
+            encoder.wait()
+            raise
+        FFmpeg.close(encoder)
+
+    @staticmethod
+    def open_encoder(output_path, size, fps, bitrate, pix_fmt, renditions, preset = None):
+        """ An ffmpeg encoding the raw frames piped to it into the output, and
+            into every rendition off the very same frames """
+        args = [
+            "-f", "rawvideo", "-vcodec", "rawvideo", "-s", "%dx%d" % (size[0], size[1]),
+            "-pix_fmt", pix_fmt, "-r", str(fps), "-an", "-i", "-"
+        ]
+        if len(renditions) > 0:
+            args = args + ["-filter_complex", Tailor.fan_out_graph("[0:v]", renditions, "cloth"), "-map", "[cloth]"]
+        main = Tailor.encode_args(bitrate, fps, size)
+        if preset is not None:
+            main = main + ["-preset", preset]
+        return FFmpeg.open(args + main + [output_path] + Tailor.rendition_outputs(output_path, renditions))
+
+    @staticmethod
+    def encode_args(bitrate, fps, size = None):
+        args = ["-c:v", Tailor.CODEC, "-b:v", bitrate, "-r", str(fps), "-an"]
+        if Tailor.bounded_rate:
+            args = args + ["-maxrate", bitrate, "-bufsize", bitrate]
+        if size is not None and (size[0] % 2 == 1 or size[1] % 2 == 1):
+            # yuv420p takes even dimensions, odd ones are left to the encoder as moviepy does
+            return args
+        return args + ["-pix_fmt", "yuv420p"]
+
+    @staticmethod
+    def rendition_path(output_path, rendition):
+        root, ext = os.path.splitext(output_path)
+        return root + "-" + rendition["suffix"] + ext
+
+    @staticmethod
+    def fan_out_graph(source, renditions, main = None):
+        """ Filters splitting `source` into every rendition, scaled & resampled,
+            plus an untouched `main` branch if given """
+        labels = (["[%s]" % (main)] if main is not None else []) + ["[r%d]" % (i) for i in range(len(renditions))]
+        graph = "%ssplit=%d%s" % (source, len(labels), "".join(labels))
+        for idx, each_rendition in enumerate(renditions):
+            filters = []
+            if each_rendition["w"] != -1 or each_rendition["h"] != -1:
+                # a missing dimension keeps the aspect ratio
+                filters.append("scale=%d:%d,setsar=1" % (
+                    each_rendition["w"] if each_rendition["w"] != -1 else -2,
+                    each_rendition["h"] if each_rendition["h"] != -1 else -2))
+            filters.append("fps=%d" % (int(each_rendition["fps"])))
+            graph = graph + ";[r%d]%s[rendition%d]" % (idx, ",".join(filters), idx)
+        return graph
+
+    @staticmethod
+    def rendition_outputs(output_path, renditions):
+        cmd = []
+        for idx, each_rendition in enumerate(renditions):
+            cmd = cmd + ["-map", "[rendition%d]" % (idx)] + Tailor.encode_args(
+                each_rendition["bitrate"], int(each_rendition["fps"])) + [Tailor.rendition_path(output_path, each_rendition)]
+        return cmd
+
+    @staticmethod
+    def fan_out(output_path, renditions):
+        """ Encodes every rendition off a single decode of the finished output """
+        Utils.log(" [Tailor] Fitting (%d) more sizes" % (len(renditions)))
+        FFmpeg.run(
+            ["-i", output_path, "-filter_complex", Tailor.fan_out_graph("[0:v]", renditions)] +
+            Tailor.rendition_outputs(output_path, renditions)
+        )
+
+class PatternSpaceExhausted(Exception):
+    pass
 
 class Mixer:
     temp_dir = "./tmp_mixer"
     output_dir = "./output"
-    def __init__(self):
+    plan_path = "./plan.json"
+    CHECKPOINT_SUFFIX = ".done"
+    FAILED_SUFFIX = ".failed"
+    PARTIAL_PREFIX = ".part-"
+    PREVIEW_PREFIX = "preview-"
+    encode_slots = None
+    # encode slots taken by this render's process(es), handed back by the
+    # parent should the worker die without releasing them
+    slots_held = None
+    def __init__(self, scan = True, config = None, storage = None, media = None, subjects = None):
         Utils.log("-------------------------------------------------------")
-        self.config = Config()
-        self.storage = Storage()
+        self.config = config if config is not None else Config()
+        self.storage = storage if storage is not None else Storage.open(self.config)
+        self.media = media if media is not None else MediaIndex()
         self.subjects = []
-        self.load_files()
+        self.library = None
+        # tells apart the temp dirs & outputs of runs sharing a working dir
+        self.run_id = ""
+        Metrics.configure(self.config.export_metrics())
+        if not scan:
+            # rendering a saved plan needs neither the subjects nor their metadata
+            Utils.log("-------------------------------------------------------")
+            return
+        if subjects is not None:
+            # handed over already scanned & probed, e.g. by the daemon
+            self.subjects = list(subjects)
+            Utils.log("-------------------------------------------------------")
+            return
+        self.subjects = self.load_subjects()
         Utils.log("-------------------------------------------------------")
 
+    def load_subjects(self):
+        """ Lists & probes the subjects, handed back rather than kept so that a
+            failed rescan leaves the ones in use untouched """
+        Metrics.begin("scan")
+        with Metrics.stage("load_files"):
+            subjects = self.load_files()
+        with Metrics.stage("probe"):
+            self.media.refresh(subjects)
+        if self.config.snap() == Config.C_SNAP_KEYFRAME:
+            with Metrics.stage("keyframes"):
+                for each_subject in subjects:
+                    self.media.keyframes(each_subject)
+                self.media.export()
+        content = self.config.export_content()
+        if content["mode"] != Config.C_CONTENT_NONE:
+            with Metrics.stage("signatures"):
+                for each_subject in subjects:
+                    self.media.signatures(each_subject, content["rate"])
+                self.media.export()
+        Metrics.end(subjects = len(subjects))
+        return subjects
+
     def assemble_subjects(self):
         assembler = {
             Config.ORD_INORDER: Utils.in_order,
@@ -388,17 +1853,102 @@ class Mixer:
         if working_format.endswith("pyc") or working_format.endswith("py"):
             raise "[x] Invalid format specifier for mixing: (%s)" % (working_format)
         Utils.log(" - Working with format: (%s)" % (working_format))
-        for each_file in os.listdir("./"):
-            if each_file.endswith(working_format):
-                self.subjects.append(each_file)
+        self.library = SourceLibrary(
+            self.config.source_roots(), working_format, self.config.source_recursive(),
+            [Mixer.temp_dir, Mixer.output_dir, self.config.patch_cache_dir(), self.config.proxy_dir()]
+        )
+        self.library.scan()
+        sample = self.config.source_sample()
+        if sample != Config.SRC_SAMPLE_DEF:
+            Utils.log(" - Sampling (%d) subjects out of the library" % (sample))
+            # drawn before the plan seeds the global generator, so with one of its own
+            fixed = self.config.seed() != Config.SEED_DEF
+            subjects = self.library.sample(sample, random.Random(self.config.seed()).randint if fixed else randint)
+        else:
+            subjects = list(self.library.files())
         
-        if len(self.subjects) == 0:
+        if len(subjects) == 0:
             raise "[x] No valid files with format (%s) found in working dir. Nothing to work on." % (working_format)
         
-        if self.config.mode() == Config.MX_SINGLE and len(self.subjects) > 1:
-            raise "[x] Too many subjects found (%d) while the mixing mode was (%s)" % (len(self.subjects), Config.MX_SINGLE)
+        if self.config.mode() == Config.MX_SINGLE and len(subjects) > 1:
+            raise "[x] Too many subjects found (%d) while the mixing mode was (%s)" % (len(subjects), Config.MX_SINGLE)
+        return subjects
+
+    def subject_bounds(self, duration):
+        """ The (start, end, min duration, max duration, passes) a clip of a subject
+            of the given duration is drawn from """
+        start_at = 0
+        end_at = 0
+        min_duration = 0
+        max_duration = 0
+        passes = True
+        # Only if we are in clipping mode, we need to set appropriate bounds
+        if self.config.clipping_mode() == Config.C_CLIP:
+            start_at = self.config.start_at() if self.config.start_at() != Config.START_DEF else 0
+            end_at = self.config.end_at() if self.config.end_at() != Config.END_DEF else duration
+            min_duration = duration if self.config.min_duration() != Config.DUR_MIN_DEF else self.config.min_duration()
+            max_duration = duration if self.config.max_duration() != Config.DUR_MAX_DEF else min(duration, self.config.max_duration())
+            passes = passes and min_duration <= duration
+            passes = passes and (end_at - start_at) <= min_duration
+        else:
+            start_at = 0
+            end_at = duration
+            min_duration = duration
+            max_duration = duration
+        return start_at, end_at, min_duration, max_duration, passes
+
+    def pattern_space(self):
+        """ Upper bound on the number of distinct patterns generate_sequence can
+            draw: every (duration, start) choice of every subject, times every
+            ordering of them when the order is random """
+        space = 1
+        for each_subject in self.subjects:
+            start_at, end_at, min_duration, max_duration, passes = self.subject_bounds(int(self.media.get(each_subject)["duration"]))
+            if not passes:
+                continue
+            space = space * max(1, sum(max(0, end_at - d - start_at + 1) for d in range(min_duration, max_duration + 1)))
+        if self.config.order() == Config.ORD_RANDOM:
+            space = space * math.factorial(len(self.subjects))
+        return space
+
+    @staticmethod
+    def pattern_hash(movie_pattern):
+        # The sequence entries are always built in the same key order, which keeps
+        # this in line with the hashes already in the history
+        return hashlib.md5(json.dumps(movie_pattern).encode('utf-8')).hexdigest()
+
+    def draw_unique_sequence(self):
+        """ Draws a pattern that is not in the history yet, giving up after a bounded
+            number of retries or as soon as every pattern of the space was seen """
+        space = self.pattern_space()
+        retries = self.config.unique_retries()
+        seen = set()
+        draws = 0
+        for _ in range(0, retries):
+            draws = draws + 1
+            movie_pattern, expected_duration, resolution = self.generate_sequence()
+            pattern_hash = Mixer.pattern_hash(movie_pattern)
+            with Metrics.stage("storage"):
+                if not self.storage.key_exists(pattern_hash):
+                    self.storage.store(pattern_hash, True)
+                    return movie_pattern, expected_duration, resolution
+            Metrics.count("unique_retries")
+            seen.add(pattern_hash)
+            if len(seen) >= space:
+                break
+            if self.config.order() == Config.ORD_RANDOM:
+                self.subjects = self.assemble_subjects()
+        raise PatternSpaceExhausted(
+            "[x] No unseen pattern left: (%d) distinct patterns seen over (%d) draws, for a space of at most (%d)" % (
+                len(seen), draws, space
+            )
+        )
 
     def generate_sequence(self):
+        with Metrics.stage("generate"):
+            return self.draw_sequence()
+
+    def draw_sequence(self):
         Utils.log(" - Generating pattern")
         seq = []
         resolution = MixerUtils.new_clip_resolution(-1, -1)
@@ -409,29 +1959,12 @@ class Mixer:
         max_st_duration = self.config.max_stitch_duration()
         for each_subject in self.subjects:
             seq_body = { "name": each_subject }
-            start_at = 0
-            end_at = 0
-            min_duration = 0
-            max_duration = 0
-            passes = True
 
-            video_clip = VideoFileClip(each_subject)
-            duration = int(video_clip.duration)
+            media_info = self.media.get(each_subject)
+            duration = int(media_info["duration"])
             seq_body["duration"] = duration
 
-            # Only if we are in clipping mode, we need to set appropriate bounds
-            if self.config.clipping_mode() == Config.C_CLIP:
-                start_at = self.config.start_at() if self.config.start_at() != Config.START_DEF else 0
-                end_at = self.config.end_at() if self.config.end_at() != Config.END_DEF else duration
-                min_duration = duration if self.config.min_duration() != Config.DUR_MIN_DEF else self.config.min_duration()
-                max_duration = duration if self.config.max_duration() != Config.DUR_MAX_DEF else min(duration, self.config.max_duration())
-                passes = passes and min_duration <= duration
-                passes = passes and (end_at - start_at) <= min_duration
-            else:
-                start_at = 0
-                end_at = duration
-                min_duration = duration
-                max_duration = duration
+            start_at, end_at, min_duration, max_duration, passes = self.subject_bounds(duration)
 
             if not passes:
                 Utils.log(
@@ -443,9 +1976,16 @@ class Mixer:
                 )
                 seq_body["skip"] = True
             else:
+                bounds = (start_at, end_at)
                 final_duration = randint(min_duration, max_duration)
-                start_at = randint(start_at, end_at - final_duration)
+                if self.config.content_mode() == Config.C_CONTENT_NONE:
+                    start_at = randint(start_at, end_at - final_duration)
+                else:
+                    start_at = self.pick_start(each_subject, start_at, end_at - final_duration, final_duration)
                 end_at = start_at + final_duration
+                if self.config.snap() == Config.C_SNAP_KEYFRAME:
+                    start_at, end_at = self.snap_bounds(each_subject, start_at, end_at, bounds, duration)
+                    final_duration = round(end_at - start_at, 6)
                 seq_body["start_at"] = start_at
                 seq_body["end_at"] = end_at
                 seq_body["duration"] = final_duration
@@ -454,7 +1994,10 @@ class Mixer:
                 total_duration = total_duration + final_duration
                 # Update resolution final data based on strategy
                 if not is_res_custom:
-                    resolution.w, resolution.h = MixerUtils.strategy_select(self.config.stitch_strategy(), resolution, video_clip)
+                    resolution.w, resolution.h = MixerUtils.strategy_select(
+                        self.config.stitch_strategy(), resolution,
+                        MixerUtils.new_clip_resolution(media_info["w"], media_info["h"])
+                    )
             seq.append(seq_body)
             if max_st_duration != Config.ST_MAX_DEF and total_duration > max_st_duration:
                 break
@@ -469,23 +2012,240 @@ class Mixer:
             )
         return seq, total_duration, resolution
 
-    def stitch_sequence(self, seq, expected_duration, resolution):
-        if len(seq) >= len(self.subjects):
-            raise "[x] Generated sequence length (%d) not equal to the number of subjects (%d)" % (len(seq), len(self.subjects))
+    def pick_start(self, subject, lo, hi, duration):
+        """ Draws a few candidate windows & keeps one with little dull footage:
+            the first one tolerable when rejecting, else one drawn in proportion
+            to how lively each is """
+        content = self.config.export_content()
+        candidates = [randint(lo, hi) for _ in range(max(1, content["candidates"]))]
+        signatures = self.media.signatures(subject, content["rate"])
+        if len(signatures) == 0:
+            return candidates[0]
+        dull = MixerUtils.dull_share(signatures, content, [(i, i + duration) for i in candidates])
+        if content["mode"] == Config.C_CONTENT_REJECT:
+            for each_candidate, each_dull in zip(candidates, dull):
+                if each_dull <= content["tolerance"]:
+                    return each_candidate
+            Utils.log("    [i] No window of (%s) is lively enough, going with the least dull one" % (subject))
+            return candidates[int(numpy.argmin(dull))]
+        weights = numpy.cumsum(1.0 - dull + 0.001)
+        return candidates[min(bisect.bisect_right(weights, random.random() * weights[-1]), len(candidates) - 1)]
+
+    def snap_bounds(self, subject, start_at, end_at, bounds, duration):
+        """ Moves the cut onto keyframes, so that the patch can be stream copied """
+        keyframes = self.media.keyframes(subject)
+        start_at = MixerUtils.snap_to(keyframes, start_at, bounds[0], bounds[1])
+        # the end of the file is as good as a keyframe for ending a cut
+        closing = [i for i in keyframes if i > start_at] + [self.media.get(subject)["duration"]]
+        end_at = MixerUtils.snap_to(closing, end_at, closing[0], max(bounds[1], closing[0]))
+        return round(start_at, 6), round(end_at, 6)
+
+    def is_copy_compatible(self, seq):
+        """ All patches can be joined by stream copy only if they were cut on
+            keyframes & share their codec, profile, pixel format, resolution & fps """
+        if self.config.snap() != Config.C_SNAP_KEYFRAME:
+            return False
+        infos = [self.media.get(i["name"]) for i in seq if "skip" not in i]
+        return len(set((i["codec"], i["profile"], i["pix_fmt"], i["w"], i["h"], i["fps"]) for i in infos)) == 1
+
+    def clip_sizes(self, seq):
+        return {i["name"]: (self.media.get(i["name"])["w"], self.media.get(i["name"])["h"]) for i in seq}
+
+    def plan_stitch(self, each_iteration, seq, expected_duration, resolution):
+        """ Everything a render needs, so that it can run away from this Mixer """
+        if len(seq) > len(self.subjects):
+            raise Exception("[x] Generated sequence length (%d) not equal to the number of subjects (%d)" % (len(seq), len(self.subjects)))
         
-        Utils.create_dir(Mixer.temp_dir, True)
+        export_config = self.config.export_stitch(resolution=resolution)
+        clip_sizes = self.clip_sizes(seq)
+        if export_config["normalize"]:
+            export_config["canvas"] = Tailor.canvas_size(
+                export_config["strategy"],
+                [clip_sizes[i["name"]] for i in seq if "skip" not in i],
+                MixerUtils.new_clip_resolution(export_config["resolution"]["w"], export_config["resolution"]["h"])
+            )
+            Utils.log(" ==> Patches get normalized to (w,h) %dx%d while cutting" % tuple(export_config["canvas"]))
+        elif self.is_copy_compatible(seq):
+            Utils.log(" ==> All patches share codec & resolution, stitching by stream copy")
+            export_config["engine"] = Config.ST_ENGINE_COPY
+        return {
+            "iteration": each_iteration,
+            "sequence": seq,
+            "expected_duration": expected_duration,
+            "resolution": [resolution.w, resolution.h],
+            "export": export_config,
+            "clip_sizes": clip_sizes,
+            "cutting": self.config.export_cutting(),
+            "metrics": self.config.export_metrics(),
+            "temp_dir": Mixer.temp_dir + "/" + self.run_id + "job-%d" % (each_iteration),
+            "output": Mixer.output_dir + "/" + self.config.output_prefix() + datetime.now().strftime("%m-%d-%Y-%H-%M-%S") + "-" + self.run_id + "%d" % (each_iteration) + "." + self.config.format()
+        }
+
+    @staticmethod
+    def init_render_worker(encode_slots, slots_held = None):
+        Mixer.encode_slots = encode_slots
+        Mixer.slots_held = slots_held
+
+    @staticmethod
+    def take_encode_slot():
+        if Mixer.encode_slots is None:
+            return
+        with Metrics.stage("encode_slot_wait"):
+            Mixer.encode_slots.acquire()
+        if Mixer.slots_held is not None:
+            with Mixer.slots_held.get_lock():
+                Mixer.slots_held.value += 1
+
+    @staticmethod
+    def take_spare_encode_slots(n):
+        """ Takes up to n more encode slots without waiting, for a render to
+            encode its chunks in parallel, returns how many were taken """
+        if Mixer.encode_slots is None:
+            return n
+        taken = 0
+        while taken < n and Mixer.encode_slots.acquire(False):
+            taken = taken + 1
+        if Mixer.slots_held is not None:
+            with Mixer.slots_held.get_lock():
+                Mixer.slots_held.value += taken
+        return taken
+
+    @staticmethod
+    def give_encode_slot():
+        if Mixer.encode_slots is None:
+            return
+        if Mixer.slots_held is not None:
+            with Mixer.slots_held.get_lock():
+                Mixer.slots_held.value -= 1
+        Mixer.encode_slots.release()
+
+    @staticmethod
+    def start_render_worker(job, encode_slots, context = multiprocessing):
+        """ Renders the job in a process of its own, so that one dying abruptly
+            (OOM kill, segfault) only fails its own job, unlike a broken pool
+            failing all of them """
+        receiver, sender = context.Pipe(False)
+        slots_held = context.Value("i", 0)
+        worker = context.Process(target = Mixer.render_worker, args = (job, encode_slots, slots_held, sender))
+        worker.start()
+        sender.close()
+        return worker, receiver, slots_held
+
+    @staticmethod
+    def join_render_worker(job, worker, receiver, slots_held, encode_slots):
+        """ Waits for a render process, returns its (output, error) """
+        try:
+            output, error = receiver.recv()
+        except EOFError:
+            output, error = None, None
+        receiver.close()
+        worker.join()
+        if output is None and error is None:
+            # hands back the encode slots the worker could not
+            for _ in range(slots_held.value):
+                encode_slots.release()
+            error = "[x] The worker rendering iteration %d died abruptly (%s)" % (job["iteration"], worker.exitcode)
+        return output, error
+
+    @staticmethod
+    def render_worker(job, encode_slots, slots_held, conn):
+        Mixer.init_render_worker(encode_slots, slots_held)
+        try:
+            conn.send((Mixer.render_job(job), None))
+        except Exception as e:
+            conn.send((None, str(e)))
+        finally:
+            conn.close()
+
+    @staticmethod
+    def render_job(job):
+        Metrics.configure(job.get("metrics"))
+        Metrics.begin("render", job["iteration"])
+        output = Metrics.profiled(job.get("metrics"), job["iteration"], Mixer.render_patches, job)
+        Metrics.end(output_bytes = os.path.getsize(output), expected_duration = job["expected_duration"])
+        return output
+
+    @staticmethod
+    def render_patches(job):
+        Utils.log("[i] Rendering iteration %d" % (job["iteration"]))
+        Utils.create_dir(job["temp_dir"], True)
+        with Metrics.stage("cut"):
+            Tailor.cut_all(job["sequence"], job["temp_dir"], job["cutting"], job["export"], job["clip_sizes"])
+        Mixer.take_encode_slot()
+        # rendered aside and moved in place once complete, so that an output
+        # which exists is always a whole one
+        partial = os.path.join(os.path.dirname(job["output"]), Mixer.PARTIAL_PREFIX + os.path.basename(job["output"]))
+        try:
+            with Metrics.stage("stitch"):
+                Tailor.stitch_patches(
+                    job["sequence"], job["temp_dir"], job["expected_duration"],
+                    job["export"], partial,
+                    clip_sizes = job["clip_sizes"]
+                )
+        finally:
+            Mixer.give_encode_slot()
+        for each_rendition in job["export"].get("renditions", []):
+            os.replace(Tailor.rendition_path(partial, each_rendition), Tailor.rendition_path(job["output"], each_rendition))
+        os.replace(partial, job["output"])
+        shutil.rmtree(job["temp_dir"], ignore_errors = True)
+        return job["output"]
+
+    def render(self, jobs, plan_path = None):
+        """ Renders the planned jobs, returns the (job, output, error) of each.
+            Every finished job is checkpointed against the plan, if any. Each job
+            only ever touches its own temp dir, so that renders of other shards
+            can share the working dir """
+        Utils.create_dir(Mixer.temp_dir)
         Utils.create_dir(Mixer.output_dir)
-        for each_seq in seq:
-            Tailor.cut_patches(each_seq, Mixer.temp_dir)
-        Tailor.stitch_patches(
-            seq, Mixer.temp_dir, expected_duration,
-            self.config.export_stitch(resolution=resolution),
-            Mixer.output_dir + "/" + self.config.output_prefix() + datetime.now().strftime("%m-%d-%Y-%H-%M-%S") + "." + self.config.format()
-        )
+        results = []
+        workers = self.config.workers()
+        if workers <= 1:
+            # a single render still has its chunks kept within the encode budget
+            Mixer.init_render_worker(
+                None if self.config.encoders() == Config.ENCODERS_DEF else multiprocessing.BoundedSemaphore(self.config.encoders()))
+            for each_job in jobs:
+                try:
+                    results.append((each_job, Mixer.render_job(each_job), None))
+                    if plan_path is not None:
+                        Mixer.checkpoint(plan_path, each_job)
+                except Exception as e:
+                    results.append((each_job, None, e))
+                    if plan_path is not None:
+                        Mixer.checkpoint(plan_path, each_job, Mixer.FAILED_SUFFIX)
+            Mixer.init_render_worker(None)
+            return results
 
-    def start(self):
-        seed()
-        Utils.log(">> MovieMix: Starting over (%d) iterations" % (self.config.iterations()))
+        encoders = workers if self.config.encoders() == Config.ENCODERS_DEF else min(workers, self.config.encoders())
+        encode_slots = None if self.config.encoders() == Config.ENCODERS_DEF else multiprocessing.BoundedSemaphore(encoders)
+        Utils.log(">> MovieMix: Rendering over (%d) workers, (%d) concurrent encodes" % (workers, encoders))
+        pending = list(jobs)
+        running = {}
+        while len(pending) > 0 or len(running) > 0:
+            while len(pending) > 0 and len(running) < workers:
+                each_job = pending.pop(0)
+                worker, receiver, slots_held = Mixer.start_render_worker(each_job, encode_slots)
+                running[worker.sentinel] = (each_job, worker, receiver, slots_held)
+            # checkpoint in completion order, so a crash loses as little as possible
+            for sentinel in multiprocessing.connection.wait(list(running.keys())):
+                each_job, worker, receiver, slots_held = running.pop(sentinel)
+                output, error = Mixer.join_render_worker(each_job, worker, receiver, slots_held, encode_slots)
+                if error is not None:
+                    results.append((each_job, None, Exception(error)))
+                    if plan_path is not None:
+                        Mixer.checkpoint(plan_path, each_job, Mixer.FAILED_SUFFIX)
+                    continue
+                results.append((each_job, output, None))
+                if plan_path is not None:
+                    Mixer.checkpoint(plan_path, each_job)
+        results.sort(key = lambda i: i[0]["iteration"])
+        return results
+
+    def plan(self):
+        """ Plans every iteration: its sequence, expected duration & resolution
+            and the settings to render it with """
+        Utils.log(">> MovieMix: Planning (%d) iterations" % (self.config.iterations()))
+        Metrics.begin("plan")
+        jobs = []
         for each_iteration in range(0, self.config.iterations()):
             Utils.log("[i] Iteration %d" % (each_iteration))
             Utils.log("")
@@ -498,25 +2258,364 @@ class Mixer:
             expected_duration = 0
             resolution = None
             if self.config.compile_pattern() == Config.COMP_UNQ:
-                while True:
-                    movie_pattern, expected_duration, resolution = self.generate_sequence()
-                    pattern_hash = hashlib.md5(json.dumps(movie_pattern).encode('utf-8')).hexdigest()
-                    if not self.storage.key_exists(pattern_hash):
-                        self.storage.store(pattern_hash, True)
-                        break
+                try:
+                    movie_pattern, expected_duration, resolution = self.draw_unique_sequence()
+                except PatternSpaceExhausted as e:
+                    Utils.log(str(e))
+                    Utils.log(" ==> Stopping at (%d) planned iterations" % (len(jobs)))
+                    break
             else:
                 movie_pattern, expected_duration, resolution = self.generate_sequence()
             
             Utils.log(" ==> Expected duration to be around ~%d" % (expected_duration))
             Utils.log(" ==> Expected resolution to be around (w,h) %dx%d" % (resolution.w, resolution.h))
             
-            # Ready to stitch the seq
-            self.stitch_sequence(movie_pattern, expected_duration, resolution)
-            
-            
-        
+            # Ready to stitch the seq, once every iteration has been planned
+            jobs.append(self.plan_stitch(each_iteration, movie_pattern, expected_duration, resolution))
+        # flush any batched unique patterns before the plan gets saved
+        with Metrics.stage("storage"):
+            self.storage.export()
+        Metrics.end(iterations = len(jobs))
+        return jobs
 
-    
-    
-m = Mixer()
-m.start()
\ No newline at end of file
+    @staticmethod
+    def save_plan(jobs, plan_path, fingerprint = None):
+        Utils.log(">> MovieMix: Saving plan of (%d) iterations to (%s)" % (len(jobs), plan_path))
+        staging = plan_path + ".tmp"
+        Utils.write_to_file(staging, json.dumps(
+            { "created": datetime.now().isoformat(), "fingerprint": fingerprint, "jobs": jobs }, indent=1))
+        os.replace(staging, plan_path)
+        # a new plan starts with a clean slate of checkpoints
+        for each_suffix in [Mixer.CHECKPOINT_SUFFIX, Mixer.FAILED_SUFFIX]:
+            if Utils.file_exists(plan_path + each_suffix):
+                os.unlink(plan_path + each_suffix)
+
+    @staticmethod
+    def load_plan(plan_path, shard = None):
+        """ Jobs of the plan which are still to be rendered, restricted to the
+            "k/n" shard if one is given """
+        if not Utils.file_exists(plan_path, check_readable=True):
+            raise Exception("[x] No plan found at: " + plan_path)
+        jobs = Utils.get_file_contents(plan_path, True)["jobs"]
+        if shard is not None:
+            k, n = [int(i) for i in shard.split("/")]
+            jobs = [i for i in jobs if i["iteration"] % n == k]
+        done = Mixer.checkpoints(plan_path)
+        pending = [i for i in jobs if not (i["iteration"] in done and Utils.file_exists(i["output"]))]
+        Utils.log(">> MovieMix: (%d) of (%d) planned iterations left to render" % (len(pending), len(jobs)))
+        return pending
+
+    @staticmethod
+    def checkpoints(plan_path, suffix = CHECKPOINT_SUFFIX):
+        checkpoint_path = plan_path + suffix
+        if not Utils.file_exists(checkpoint_path):
+            return set()
+        done = set()
+        for line in Utils.get_file_contents(checkpoint_path).splitlines():
+            # a torn last line from a crash is just not a checkpoint
+            if line.strip().isdigit():
+                done.add(int(line))
+        return done
+
+    @staticmethod
+    def checkpoint(plan_path, job, suffix = CHECKPOINT_SUFFIX):
+        with open(plan_path + suffix, "a") as f:
+            f.write("%d\n" % (job["iteration"]))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def preview_job(self, job, proxies):
+        """ The job, cut from the proxies instead & rendered small and fast.
+            Sequence timings are left as is, so the preview shows the very cuts
+            the full quality render will make """
+        preview = json.loads(json.dumps(job))
+        proxy_config = self.config.export_proxy()
+        for each_clip in preview["sequence"]:
+            each_clip["name"] = proxies[each_clip["name"]]
+        preview["clip_sizes"] = {proxies[k]: (self.media.get(proxies[k])["w"], self.media.get(proxies[k])["h"]) for k in job["clip_sizes"]}
+        factor = min(1.0, float(proxy_config["height"]) / max(i[1] for i in job["clip_sizes"].values()))
+        export_config = preview["export"]
+        for k in ["w", "h"]:
+            if export_config["resolution"][k] != -1:
+                export_config["resolution"][k] = max(2, int(round(export_config["resolution"][k] * factor / 2)) * 2)
+        if export_config.get("canvas") is not None:
+            export_config["canvas"] = [max(2, int(round(i * factor / 2)) * 2) for i in export_config["canvas"]]
+        export_config["fps"] = min(export_config["fps"], proxy_config["fps"])
+        export_config["bitrate"] = proxy_config["bitrate"]
+        export_config["renditions"] = []
+        preview["temp_dir"] = job["temp_dir"] + "-preview"
+        preview["output"] = os.path.join(os.path.dirname(job["output"]), Mixer.PREVIEW_PREFIX + os.path.basename(job["output"]))
+        return preview
+
+    def preview(self, jobs):
+        """ Renders the planned jobs off low resolution proxies of their sources,
+            making any proxy missing from the cache first """
+        Utils.log(">> MovieMix: Previewing (%d) iterations" % (len(jobs)))
+        proxy_config = self.config.export_proxy()
+        timeout = None if self.config.cut_timeout() == Config.CUT_TIMEOUT_DEF else self.config.cut_timeout()
+        names = sorted(set(i["name"] for each_job in jobs for i in each_job["sequence"]))
+        Metrics.begin("proxies")
+        with Metrics.stage("proxies"):
+            with concurrent.futures.ThreadPoolExecutor(max_workers = max(1, self.config.cut_threads())) as pool:
+                proxies = dict(zip(names, pool.map(
+                    lambda i: ProxyCache.ensure(proxy_config, i, (self.media.get(i)["w"], self.media.get(i)["h"]), timeout), names)))
+        Metrics.end(proxies = len(names))
+        preview_jobs = [self.preview_job(i, proxies) for i in jobs]
+        # with the proxies probed by preview_job, so that the next preview finds them indexed
+        self.media.export()
+        return Mixer.summarize(self.render(preview_jobs))
+
+    def render_plan(self, plan_path, shard = None):
+        jobs = Mixer.load_plan(plan_path, shard)
+        return Mixer.summarize(self.render(jobs, plan_path))
+
+    @staticmethod
+    def summarize(results):
+        Utils.log(">> MovieMix: Summary")
+        for each_job, output, error in results:
+            if error is None:
+                Utils.log(" - Iteration %d: (%s)" % (each_job["iteration"], output))
+            else:
+                Utils.log(" [x] Iteration %d failed: %s" % (each_job["iteration"], error))
+        return results
+
+    @staticmethod
+    def failures(results):
+        return [each_job["iteration"] for each_job, _, error in results if error is not None]
+
+    def seed(self):
+        # a fixed seed makes the plan reproducible, e.g. for benchmarks
+        seed(None if self.config.seed() == Config.SEED_DEF else self.config.seed())
+
+    def fingerprint(self):
+        """ Of the config & the subjects (as they are on disk) a plan is made for """
+        subjects = [[os.path.abspath(i)] + list(MediaIndex.fingerprint(i)) for i in sorted(self.subjects)]
+        return hashlib.sha1(json.dumps([self.config.config, subjects], sort_keys=True).encode("utf-8")).hexdigest()
+
+    def resumable(self, fingerprint):
+        """ Iterations of the saved plan which are still to be rendered, if it was
+            made for the very same config & subjects. Those which failed are not
+            retried, rather than failing every start over again """
+        if not Utils.file_exists(Mixer.plan_path, check_readable=True):
+            return []
+        if Utils.get_file_contents(Mixer.plan_path, True).get("fingerprint") != fingerprint:
+            Utils.log(">> MovieMix: The plan at (%s) is for other settings or sources, planning anew" % (Mixer.plan_path))
+            return []
+        failed = Mixer.checkpoints(Mixer.plan_path, Mixer.FAILED_SUFFIX)
+        jobs = Mixer.load_plan(Mixer.plan_path)
+        if any(i["iteration"] in failed for i in jobs):
+            Utils.log(">> MovieMix: Not retrying the iterations which failed, \"render\" would")
+        return [i for i in jobs if i["iteration"] not in failed]
+
+    def start(self):
+        # rerunning after a crash picks the plan up where it stopped, rather than
+        # drawing (& storing) new patterns for the iterations already planned
+        fingerprint = self.fingerprint()
+        jobs = self.resumable(fingerprint)
+        if len(jobs) > 0:
+            Utils.log(">> MovieMix: Resuming the unfinished plan at (%s), run \"plan\" to start over" % (Mixer.plan_path))
+        else:
+            self.seed()
+            jobs = self.plan()
+            Mixer.save_plan(jobs, Mixer.plan_path, fingerprint)
+        return Mixer.summarize(self.render(jobs, Mixer.plan_path))
+
+
+class MixerService:
+    """ Keeps a Mixer warm (config, pattern store, media & keyframe index, source
+        library) and renders mix jobs posted over a local HTTP endpoint. Jobs
+        are dispatched by priority, with at most `daemon.encoders` rendering at
+        once, each render in a process of its own """
+    # what is left of the jobs of a previous run, renders of shards are left alone
+    RE_JOB_DIR = re.compile(r"^d\d+-")
+    def __init__(self):
+        self.mixer = Mixer()
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.queue = queue.PriorityQueue()
+        self.counter = itertools.count()
+        self.encoders = max(1, self.mixer.config.daemon_encoders())
+        self.slots = threading.BoundedSemaphore(self.encoders)
+        # renders are forked off a server started before any thread is, with the
+        # modules already imported, rather than off this multi-threaded process
+        self.context = multiprocessing.get_context("forkserver")
+        self.context.set_forkserver_preload(["__main__", "moviepy.editor"])
+        # shared by the renders, so that chunked ones stay within the budget too
+        self.encode_slots = self.context.BoundedSemaphore(self.encoders)
+        Utils.create_dir(Mixer.temp_dir)
+        for each_dir in os.listdir(Mixer.temp_dir):
+            if MixerService.RE_JOB_DIR.match(each_dir):
+                shutil.rmtree(os.path.join(Mixer.temp_dir, each_dir), ignore_errors = True)
+        Utils.create_dir(Mixer.output_dir)
+
+    def submit(self, overrides = None, priority = 0):
+        job_id = next(self.counter)
+        job = { "id": job_id, "state": "queued", "priority": priority, "overrides": overrides or {}, "outputs": [], "errors": [] }
+        with self.lock:
+            self.jobs[job_id] = job
+        # higher priorities first, then first come first served
+        self.queue.put((-priority, job_id))
+        return job_id
+
+    def status(self, job_id = None):
+        with self.lock:
+            copies = {k: dict(v, outputs = list(v["outputs"]), errors = list(v["errors"])) for k, v in self.jobs.items()}
+        return list(copies.values()) if job_id is None else copies.get(job_id)
+
+    def dispatch(self):
+        while True:
+            self.slots.acquire()
+            _, job_id = self.queue.get()
+            try:
+                self.start_job(self.jobs[job_id])
+            except Exception as e:
+                with self.lock:
+                    self.jobs[job_id]["state"] = "failed"
+                    self.jobs[job_id]["errors"].append(str(e))
+                self.slots.release()
+
+    def start_job(self, job):
+        started = time.perf_counter()
+        with self.lock:
+            job["state"] = "planning"
+            config = Config(overrides = job["overrides"], base = self.mixer.config.config)
+            rescan = any(k in job["overrides"] for k in ["sources", "format"])
+            mixer = Mixer(
+                config = config, storage = self.mixer.storage, media = self.mixer.media,
+                subjects = None if rescan else self.mixer.subjects
+            )
+            mixer.run_id = "d%d-" % (job["id"])
+            mixer.seed()
+            plans = mixer.plan()
+            job["state"] = "rendering"
+            job["pending"] = len(plans)
+        Utils.log(">> MovieMix daemon: Job (%d) planned in %.1fms" % (job["id"], (time.perf_counter() - started) * 1000))
+        if len(plans) == 0:
+            self.finish(job)
+        for each_plan in plans:
+            worker = Mixer.start_render_worker(each_plan, self.encode_slots, self.context)
+            threading.Thread(target = self.rendered, args = (job, each_plan) + worker, daemon = True).start()
+
+    def rendered(self, job, each_plan, worker, receiver, slots_held):
+        output, error = Mixer.join_render_worker(each_plan, worker, receiver, slots_held, self.encode_slots)
+        # the rest of tmp_mixer belongs to jobs still rendering
+        shutil.rmtree(each_plan["temp_dir"], ignore_errors = True)
+        with self.lock:
+            if error is None:
+                job["outputs"].append(output)
+                job["outputs"].extend(Tailor.rendition_path(output, i) for i in each_plan["export"].get("renditions", []))
+            else:
+                job["errors"].append(error)
+            job["pending"] = job["pending"] - 1
+            if job["pending"] > 0:
+                return
+        self.finish(job)
+
+    def finish(self, job):
+        with self.lock:
+            job["state"] = "failed" if len(job["errors"]) > 0 else "done"
+        Utils.log(">> MovieMix daemon: Job (%d) %s" % (job["id"], job["state"]))
+        self.slots.release()
+
+    def watch(self):
+        """ Picks up new, changed or removed sources, only relisting the
+            directories which changed """
+        while True:
+            time.sleep(self.mixer.config.daemon_watch())
+            try:
+                with self.lock:
+                    subjects = self.mixer.load_subjects()
+                    if set(subjects) != set(self.mixer.subjects):
+                        Utils.log(">> MovieMix daemon: Now working with (%d) subjects" % (len(subjects)))
+                    self.mixer.subjects = subjects
+            except Exception as e:
+                Utils.log(" [x] Failed to rescan the sources: %s" % (e))
+
+    def serve(self):
+        # have the fork server up (& warm) before the first job, & any thread, comes in
+        multiprocessing.forkserver.ensure_running()
+        threading.Thread(target = self.dispatch, daemon = True).start()
+        threading.Thread(target = self.watch, daemon = True).start()
+        MixerRequestHandler.service = self
+        host, port = self.mixer.config.daemon_host(), self.mixer.config.daemon_port()
+        server = http.server.ThreadingHTTPServer((host, port), MixerRequestHandler)
+        Utils.log(">> MovieMix daemon: Listening on http://%s:%d, (%d) concurrent encodes" % (host, port, self.encoders))
+        server.serve_forever()
+
+
+class MixerRequestHandler(http.server.BaseHTTPRequestHandler):
+    """ POST /jobs {"config": {...overrides}, "priority": n} queues a mix job,
+        GET /jobs lists them & GET /jobs/<id> reports on one """
+    service = None
+
+    def reply(self, code, body):
+        contents = json.dumps(body).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(contents)))
+        self.end_headers()
+        self.wfile.write(contents)
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            return self.reply(404, { "error": "not found" })
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length).decode("utf-8")) if length > 0 else {}
+        except ValueError:
+            return self.reply(400, { "error": "invalid json" })
+        if not isinstance(request, dict):
+            return self.reply(400, { "error": "the body must be a JSON object" })
+        if request.get("config") is not None and not isinstance(request["config"], dict):
+            return self.reply(400, { "error": "config must be an object" })
+        priority = request.get("priority", 0)
+        if not isinstance(priority, int) or isinstance(priority, bool):
+            return self.reply(400, { "error": "priority must be an integer" })
+        job_id = self.service.submit(request.get("config"), priority)
+        self.reply(202, { "id": job_id })
+
+    def do_GET(self):
+        parts = [i for i in self.path.split("/") if i != ""]
+        if parts == ["jobs"]:
+            return self.reply(200, self.service.status())
+        if len(parts) == 2 and parts[0] == "jobs" and parts[1].isdigit():
+            job = self.service.status(int(parts[1]))
+            return self.reply(200, job) if job is not None else self.reply(404, { "error": "no such job" })
+        self.reply(404, { "error": "not found" })
+
+    def log_message(self, format, *args):
+        Utils.log(" [daemon] " + format % args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "MovieMix")
+    parser.add_argument("command", nargs = "?", default = "start", choices = ["start", "plan", "preview", "render", "serve"],
+        help = "start: plan & render, plan: only write the plan, preview: write the plan & render it off low resolution proxies, " +
+            "render: render (or resume) a saved plan, serve: run as a daemon")
+    parser.add_argument("--plan", default = Mixer.plan_path, help = "path of the plan file")
+    parser.add_argument("--shard", default = None, help = "only render the iterations k of every n, as \"k/n\"")
+    args = parser.parse_args()
+
+    Mixer.plan_path = args.plan
+    if args.command == "plan":
+        m = Mixer()
+        fingerprint = m.fingerprint()
+        m.seed()
+        Mixer.save_plan(m.plan(), Mixer.plan_path, fingerprint)
+    elif args.command == "preview":
+        m = Mixer()
+        fingerprint = m.fingerprint()
+        m.seed()
+        jobs = m.plan()
+        Mixer.save_plan(jobs, Mixer.plan_path, fingerprint)
+        results = m.preview(jobs)
+        Utils.log(">> MovieMix: Render the plan at full quality with: render --plan %s" % (Mixer.plan_path))
+        sys.exit(1 if len(Mixer.failures(results)) > 0 else 0)
+    elif args.command == "serve":
+        MixerService().serve()
+    elif args.command == "render":
+        m = Mixer(scan = False)
+        sys.exit(1 if len(Mixer.failures(m.render_plan(Mixer.plan_path, args.shard))) > 0 else 0)
+    else:
+        m = Mixer()
+        sys.exit(1 if len(Mixer.failures(m.start())) > 0 else 0)
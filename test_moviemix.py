@@ -0,0 +1,156 @@
+import random
+
+import pytest
+
+from moviemix import (
+    BloomFilter, Config, Mixer, MixerUtils, PatternSpaceExhausted, SourceLibrary, Tailor, Utils
+)
+
+
+class MemoryStorage:
+    """ Pattern history kept in memory, with the interface of Storage """
+    def __init__(self):
+        self.patterns = {}
+
+    def key_exists(self, k):
+        return k in self.patterns
+
+    def store(self, k, v):
+        self.patterns[k] = v
+
+    def export(self):
+        pass
+
+
+class FixedMedia:
+    """ Media index of subjects all probed the same """
+    def __init__(self, duration = 10, w = 320, h = 240):
+        self.info = { "duration": duration, "w": w, "h": h }
+
+    def get(self, _):
+        return dict(self.info)
+
+
+def new_mixer(ordering, subjects = ("a.mp4", "b.mp4", "c.mp4")):
+    config = Config(base = {
+        "mix_mode": "multi", "ordering": ordering, "format": "mp4",
+        "clipping": { "mode": "full", "compile": "unique", "retries": 200 }
+    })
+    mixer = Mixer(scan = False, config = config, storage = MemoryStorage(), media = FixedMedia())
+    mixer.subjects = list(subjects)
+    return mixer
+
+
+def test_pattern_space_counts_orderings_when_random():
+    assert new_mixer(Config.ORD_RANDOM).pattern_space() == 6
+    assert new_mixer(Config.ORD_INORDER).pattern_space() == 1
+
+
+def test_unique_draws_stop_once_the_space_is_exhausted():
+    random.seed(0)
+    mixer = new_mixer(Config.ORD_RANDOM)
+    for _ in range(6):
+        mixer.draw_unique_sequence()
+    assert len(mixer.storage.patterns) == 6
+    with pytest.raises(PatternSpaceExhausted) as e:
+        mixer.draw_unique_sequence()
+    assert "(6) distinct patterns seen" in str(e.value)
+    assert "space of at most (6)" in str(e.value)
+    assert len(mixer.storage.patterns) == 6
+
+
+def test_unique_draws_in_order_exhaust_after_one():
+    mixer = new_mixer(Config.ORD_INORDER)
+    mixer.draw_unique_sequence()
+    with pytest.raises(PatternSpaceExhausted) as e:
+        mixer.draw_unique_sequence()
+    assert "over (1) draws" in str(e.value)
+
+
+def test_split_chunks_keeps_order_and_balance():
+    patches = ["p%d" % (i) for i in range(12)]
+    durations = { i: 10 for i in patches }
+    segments = Tailor.split_chunks(patches, durations, 4)
+    assert [i for each_segment in segments for i in each_segment] == patches
+    assert [len(i) for i in segments] == [3, 3, 3, 3]
+
+
+def test_split_chunks_never_goes_below_the_minimum_duration():
+    patches = ["p%d" % (i) for i in range(12)]
+    durations = { i: 5 for i in patches }
+    assert len(Tailor.split_chunks(patches, durations, 8)) == 60 // Tailor.CHUNK_MIN_DURATION
+    assert Tailor.split_chunks(patches[:2], durations, 8) == [patches[:2]]
+
+
+def test_split_chunks_loops_of_one_patch():
+    patches = ["p0", "p1", "p0", "p1", "p0", "p1"]
+    durations = { "p0": 20, "p1": 20 }
+    segments = Tailor.split_chunks(patches, durations, 3)
+    assert segments == [["p0", "p1"], ["p0", "p1"], ["p0", "p1"]]
+
+
+def test_snap_to():
+    keyframes = [0.0, 2.0, 4.0, 6.0]
+    # the keyframe at or before t, within bounds
+    assert MixerUtils.snap_to(keyframes, 3.5, 0, 10) == 2.0
+    assert MixerUtils.snap_to(keyframes, 4.0, 0, 10) == 4.0
+    # the one before is out of bounds: the first one after
+    assert MixerUtils.snap_to(keyframes, 3.5, 3, 10) == 4.0
+    # no keyframe within bounds: t as is
+    assert MixerUtils.snap_to(keyframes, 3.5, 3, 3.9) == 3.5
+    assert MixerUtils.snap_to([], 1.5, 0, 10) == 1.5
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000)
+    keys = ["key-%d" % (i) for i in range(1000)]
+    for k in keys:
+        bloom.add(k)
+    assert all(k in bloom for k in keys)
+    false_positives = sum(("other-%d" % (i)) in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_source_library_sample(tmp_path, monkeypatch):
+    monkeypatch.setattr(SourceLibrary, "index_path", str(tmp_path / "library_index.json"))
+    sources = tmp_path / "sources"
+    sources.mkdir()
+    for i in range(10):
+        (sources / ("s%d.mp4" % (i))).write_bytes(b"")
+    library = SourceLibrary([str(sources)], "mp4")
+    library.scan()
+    files = set(library.files())
+    assert len(files) == 10
+
+    picked = library.sample(3, random.Random(1).randint)
+    assert len(set(picked)) == 3 and set(picked) <= files
+    # a seeded draw is reproducible
+    assert library.sample(3, random.Random(1).randint) == picked
+    # asking for more than there is gives everything
+    assert set(library.sample(20)) == files
+
+
+def test_source_library_sample_is_uniform(tmp_path, monkeypatch):
+    monkeypatch.setattr(SourceLibrary, "index_path", str(tmp_path / "library_index.json"))
+    for i in range(4):
+        (tmp_path / ("s%d.mp4" % (i))).write_bytes(b"")
+    library = SourceLibrary([str(tmp_path)], "mp4")
+    library.scan()
+    rng = random.Random(7)
+    counts = {}
+    for _ in range(4000):
+        picked = library.sample(1, rng.randint)[0]
+        counts[picked] = counts.get(picked, 0) + 1
+    assert len(counts) == 4
+    assert all(850 < i < 1150 for i in counts.values())
+
+
+def test_merge_is_deep_and_leaves_base_alone():
+    base = { "stitch": { "engine": "ffmpeg", "frames": { "fps": 25, "bitrate": "500k" } }, "iterations": 1 }
+    merged = Utils.merge(base, { "stitch": { "frames": { "fps": 30 } }, "iterations": 3, "seed": 4 })
+    assert merged == { "stitch": { "engine": "ffmpeg", "frames": { "fps": 30, "bitrate": "500k" } }, "iterations": 3, "seed": 4 }
+    assert base["stitch"]["frames"]["fps"] == 25
+    assert base["iterations"] == 1
+    # a dict over a value, or a value over a dict, replaces it
+    assert Utils.merge({ "a": 1 }, { "a": { "b": 2 } }) == { "a": { "b": 2 } }
+    assert Utils.merge({ "a": { "b": 2 } }, { "a": 1 }) == { "a": 1 }